@@ -34,13 +34,46 @@ Implementation Notes
 """
 
 # imports
-import math
+from array import array
 
 try:
-    from typing import Dict, List, Optional, Tuple
+    from typing import Dict, List, Optional, Tuple, Union
 except ImportError:
     pass
 
+try:
+    from time import monotonic_ns as _monotonic_ns
+except ImportError:
+    from time import monotonic
+
+    def _monotonic_ns() -> int:
+        """Nanosecond clock from a float one, for builds without monotonic_ns"""
+        return int(monotonic() * 1000000000)
+
+
+try:
+    from gc import mem_alloc as _mem_alloc
+except ImportError:
+    try:
+        import tracemalloc
+
+        def _mem_alloc() -> Optional[int]:
+            """Size of the traced heap, if tracemalloc is tracing"""
+            if not tracemalloc.is_tracing():
+                return None
+            return tracemalloc.get_traced_memory()[0]
+
+    except ImportError:
+
+        def _mem_alloc() -> Optional[int]:
+            return None
+
+
+try:
+    from collections import OrderedDict
+except ImportError:
+    OrderedDict = dict
+
 __version__ = "0.0.0+auto.0"
 __repo__ = "https://github.com/adafruit/Adafruit_CircuitPython_miniQR.git"
 
@@ -50,9 +83,68 @@ L = 1
 H = 2
 Q = 3
 
+# Framebuffer layouts for QRBitMatrix.blit, numbered like the framebuf module
+MONO_VLSB = 0
+RGB565 = 1
+MONO_HLSB = 3
+
+# Function-pattern templates drawn so far, keyed by QR type and least
+# recently used first. Each one holds copies of the matrix buffer and used
+# map plus the data placement path and mask planes, about 10 kB for type 9
+# and 110 kB for type 40, so they are kept to this many bytes in all: a
+# sixteenth of the free heap at import on boards, enough for every type on
+# a computer. Types whose template would not fit map their data directly
+try:
+    from gc import mem_free
+
+    TEMPLATE_CACHE_BYTES = mem_free() // 16
+except ImportError:
+    TEMPLATE_CACHE_BYTES = 1 << 22
+_TEMPLATES = OrderedDict()
+
+_MODE_NUMBER = 1 << 0
+_MODE_ALPHA_NUM = 1 << 1
 _MODE_8BIT_BYTE = 1 << 2
+_MODE_STRUCTURED_APPEND = 0b0011
+# mode, symbol index, symbol count - 1 and parity byte
+_STRUCTURED_APPEND_BITS = 4 + 4 + 4 + 8
+
+# Micro QR mode indicator and character count field size in M1 to M4 for
+# each mode, 0 where the version lacks it
+_MICRO_MODES = {
+    _MODE_NUMBER: (0, b"\x03\x04\x05\x06"),
+    _MODE_ALPHA_NUM: (1, b"\x00\x03\x04\x05"),
+    _MODE_8BIT_BYTE: (2, b"\x00\x00\x04\x05"),
+}
+# Micro QR (type, ECC): symbol number, data bits and error correction
+# codewords. M1 only detects errors, so takes None as its ECC level
+_MICRO_SYMBOLS = {
+    (1, None): (0, 20, 2),
+    (2, L): (1, 40, 5),
+    (2, M): (2, 32, 6),
+    (3, L): (3, 84, 6),
+    (3, M): (4, 68, 8),
+    (4, L): (5, 128, 8),
+    (4, M): (6, 112, 10),
+    (4, Q): (7, 80, 14),
+}
+# the QR mask patterns Micro QR masks 0-3 use
+_MICRO_MASKS = b"\x01\x04\x06\x07"
+_MICRO_FORMAT_MASK = 0b100010001000101
+
+# alphanumeric mode value of each ASCII byte, 0xFF where it has none
+_ALPHA_NUM_VALUES = bytearray(b"\xff" * 128)
+for _i, _c in enumerate(b"0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ $%*+-./:"):
+    _ALPHA_NUM_VALUES[_c] = _i
 _PAD0 = 0xEC
 _PAD1 = 0x11
+_PAD_BYTES = bytes((_PAD0, _PAD1))
+
+# get_scanlines byte expansion tables, keyed by scale
+_EXPAND_TABLES = {}
+
+# terminal characters for a dark or light top and bottom half
+_HALF_BLOCKS = (" ", "\u2584", "\u2580", "\u2588")
 
 # Optimized polynomial helpers
 
@@ -78,57 +170,510 @@ EXP_TABLE = b"\x01\x02\x04\x08\x10 @\x80\x1d:t\xe8\xcd\x87\x13&L\x98-Z\xb4u\xea\
 LOG_TABLE = b"\x00\x00\x01\x19\x022\x1a\xc6\x03\xdf3\xee\x1bh\xc7K\x04d\xe0\x0e4\x8d\xef\x81\x1c\xc1i\xf8\xc8\x08Lq\x05\x8ae/\xe1$\x0f!5\x93\x8e\xda\xf0\x12\x82E\x1d\xb5\xc2}j'\xf9\xb9\xc9\x9a\txM\xe4r\xa6\x06\xbf\x8bbf\xdd0\xfd\xe2\x98%\xb3\x10\x91\"\x886\xd0\x94\xce\x8f\x96\xdb\xbd\xf1\xd2\x13\\\x838F@\x1eB\xb6\xa3\xc3H~nk:(T\xfa\x85\xba=\xca^\x9b\x9f\n\x15y+N\xd4\xe5\xacs\xf3\xa7W\x07p\xc0\xf7\x8c\x80c\rgJ\xde\xed1\xc5\xfe\x18\xe3\xa5\x99w&\xb8\xb4|\x11D\x92\xd9# \x89.7?\xd1[\x95\xbc\xcf\xcd\x90\x87\x97\xb2\xdc\xfc\xbea\xf2V\xd3\xab\x14*]\x9e\x84<9SGmA\xa2\x1f-C\xd8\xb7{\xa4v\xc4\x17I\xec\x7f\x0co\xf6l\xa1;R)\x9dU\xaa\xfb`\x86\xb1\xbb\xcc>Z\xcbY_\xb0\x9c\xa9\xa0Q\x0b\xf5\x16\xebzu,\xd7O\xae\xd5\xe9\xe6\xe7\xad\xe8t\xd6\xf4\xea\xa8PX\xaf"  # noqa: E501
 
 
+# EXP_TABLE repeated so the sum of two logs never has to be reduced mod 255
+_EXP2_TABLE = EXP_TABLE[:255] * 2
+
+# Cache of Reed-Solomon generator polynomials, keyed by ECC codeword count
+_RS_GENERATORS = {}
+
+
+def _rs_generator(ec_count: int) -> bytes:
+    """The Reed-Solomon generator polynomial for `ec_count` codewords, as the
+    logs of its coefficients (highest degree first, leading 1 dropped)"""
+    generator = _RS_GENERATORS.get(ec_count)
+    if generator is None:
+        poly = bytearray(b"\x01")
+        for i in range(ec_count):
+            # multiply by (x - a^i)
+            product = bytearray(len(poly) + 1)
+            for j, coef in enumerate(poly):
+                product[j] ^= coef
+                if coef:
+                    product[j + 1] ^= _EXP2_TABLE[LOG_TABLE[coef] + i]
+            poly = product
+        generator = bytes(LOG_TABLE[coef] for coef in poly[1:])
+        _RS_GENERATORS[ec_count] = generator
+    return generator
+
+
 class QRCode:
     """The generator class for QR code matrices"""
 
-    def __init__(self, *, qr_type: Optional[int] = None, error_correct: int = L):
+    __slots__ = (
+        "ECC",
+        "_auto_type",
+        "_bit_buffer",
+        "_bit_buffer_range",
+        "_length_bits",
+        "_template",
+        "cache",
+        "data_cache",
+        "data_list",
+        "low_memory",
+        "mask_pattern",
+        "matrix",
+        "module_count",
+        "optimize",
+        "stats",
+        "structured_append",
+        "type",
+    )
+
+    def __init__(  # noqa: PLR0913 Too many arguments
+        self,
+        *,
+        qr_type: Optional[int] = None,
+        error_correct: int = L,
+        optimize: bool = False,
+        stats: bool = False,
+        cache: Optional["QRMatrixCache"] = None,
+        low_memory: bool = False,
+        structured_append: Optional[Tuple[int, int, int]] = None,
+    ):
         """Initialize an empty QR code. You can define the `qr_type` (size)
         of the code matrix, or have the libary auto-select the smallest
         match. Default `error_correct` is type L (7%), but you can select M,
-        Q or H."""
+        Q or H. All data is stored in 8 bit byte mode unless `optimize` is
+        set, then each chunk is split into the cheapest mix of numeric,
+        alphanumeric and byte mode segments. Set `stats` to have `make`
+        record the time spent in each stage in the `stats` dict, which holds
+        just a "cache_hit" entry when the matrix came from the cache. Pass a
+        `QRMatrixCache` as `cache` to reuse matrices made before for the
+        same data and settings. Set `low_memory` to have `make` free all
+        but the finished matrix, dropping its `used` map too. Pass
+        `structured_append` as (index, count, parity) to make this symbol
+        `index` of `count` linked ones, see `split`."""
+        if (
+            structured_append is not None
+            and not 0 <= structured_append[0] < (structured_append[1]) <= 16
+        ):
+            raise ValueError("Structured append index must be below a count of up to 16")
         self.type = qr_type
         self.ECC = error_correct
+        self.optimize = optimize
         self.matrix = None
         self.module_count = 0
         self.data_cache = None
         self.data_list = []
+        self.mask_pattern = None
+        # stage name: (nanoseconds, net heap growth in bytes or None)
+        self.stats = {} if stats else None
+        self.cache = cache
+        self.low_memory = low_memory
+        self.structured_append = structured_append
+        self._template = None
+        self._auto_type = qr_type is None
+        # running encoded length of data_list for types 1-9, 10-26 and 27-40,
+        # whose character count fields differ
+        header_bits = 0 if structured_append is None else _STRUCTURED_APPEND_BITS
+        self._length_bits = [header_bits, header_bits, header_bits]
+        # the segments written so far, for one of those type ranges
+        self._bit_buffer = None
+        self._bit_buffer_range = None
 
     def add_data(self, data: bytes) -> None:
-        """Add more data to the QR code, must be bytestring stype"""
+        """Add more data to the QR code. Can be a bytestring, or a str which
+        is UTF-8 encoded. A bytearray or memoryview is kept without copying
+        so leave it unchanged until the code is made"""
+        if isinstance(data, str):
+            data = str.encode(data)
         self.data_list.append(data)
-        datalen = sum(len(x) for x in self.data_list)
-        if not self.type:
-            for qr_type in range(1, 10):
-                rs_blocks = _get_rs_blocks(qr_type, self.ECC)
-                total_data_count = 0
-                for block in rs_blocks:
-                    total_data_count += block["data"]
-                if total_data_count > datalen:
-                    self.type = qr_type
-                    break
+
+        for i, qr_type in enumerate((1, 10, 27)):
+            for mode, segment in _get_segments(data, qr_type, self.optimize):
+                self._length_bits[i] += _get_segment_length_bits(mode, len(segment), qr_type)
+
+        if self._auto_type:
+            # data only grows, so carry on from the last type picked
+            qr_type = self.type or 1
+            while qr_type < 40 and self._length_bits[_get_length_range(qr_type)] > (
+                _get_data_count(qr_type, self.ECC) * 8
+            ):
+                qr_type += 1
+            self.type = qr_type
+
+        if self._bit_buffer is not None:
+            if self._bit_buffer_range == _get_length_range(self.type):
+                QRCode._write_data(self._bit_buffer, data, self.type, self.optimize)
+            else:
+                self._bit_buffer = None
         self.data_cache = None
 
-    def make(self, *, test: bool = False, mask_pattern: int = 0) -> None:
+    @staticmethod
+    def plan(
+        data: bytes, *, error_correct: int = L, optimize: bool = False
+    ) -> Tuple[int, int, int]:
+        """Pick the QR type for some data without making the code. Returns
+        the type, how many data bits are left over in it and the module
+        count, or raises RuntimeError if the data does not fit in any type"""
+        qr = QRCode(error_correct=error_correct, optimize=optimize)
+        qr.add_data(data)
+        capacity = _get_data_count(qr.type, error_correct) * 8
+        length_bits = qr._length_bits[_get_length_range(qr.type)]
+        if length_bits > capacity:
+            raise RuntimeError(f"Code length overflow: {length_bits} > {capacity}")
+        return qr.type, capacity - length_bits, qr.type * 4 + 17
+
+    @staticmethod
+    def split(
+        data: bytes, *, error_correct: int = L, optimize: bool = False, max_version: int = 9
+    ) -> List["QRCode"]:
+        """Split data too big for one code of at most `max_version` into up
+        to 16 Structured Append codes, which scanners join back together.
+        The data is shared out evenly over the fewest codes it fits in, so
+        each is as small a type as it can be. Returns the codes ready to
+        `make`, each independent of the others, or a single plain code if
+        the data fits in one. Raises RuntimeError if it needs more than 16"""
+        if isinstance(data, str):
+            data = str.encode(data)
+        parity = 0
+        for byte in data:
+            parity ^= byte
+        for count in range(1, 17):
+            size, extra = divmod(len(data), count)
+            codes = []
+            start = 0
+            for index in range(count):
+                end = start + size + (index < extra)
+                qr = QRCode(
+                    error_correct=error_correct,
+                    optimize=optimize,
+                    structured_append=None if count == 1 else (index, count, parity),
+                )
+                qr.add_data(data[start:end])
+                start = end
+                capacity = _get_data_count(qr.type, error_correct) * 8
+                if qr.type > max_version or qr._length_bits[_get_length_range(qr.type)] > capacity:
+                    break
+                codes.append(qr)
+            else:
+                return codes
+        raise RuntimeError(f"Data does not fit in 16 codes of up to type {max_version}")
+
+    def make(self, *, test: bool = False, mask_pattern: Union[int, str] = 0) -> None:
         """Perform the actual generation of the QR matrix. To keep things
         small and speedy we don't generate all 8 mask patterns and pick
-        the best. Instead, please pass in a desired mask_pattern, the
-        default mask is 0."""
+        the best by default. Instead, please pass in a desired mask_pattern,
+        the default mask is 0. Pass ``"auto"`` to lay the data out once,
+        score all 8 masks with the ISO 18004 penalty rules and keep the
+        best one, which is then stored in `mask_pattern`. That takes about
+        4-8 times as long as a fixed mask for types 3-9 on CPython, and
+        scores whole rows as ints, so from type 2 up it needs a build with
+        long integer support; a fixed mask does not. With a `cache`
+        the matrix is a `QRFrozenMatrix`, and may be shared with other
+        codes."""
+        for _ in self.make_steps(test=test, mask_pattern=mask_pattern, step_size=0):
+            pass
+
+    async def make_async(
+        self, *, test: bool = False, mask_pattern: Union[int, str] = 0, step_size: int = 64
+    ) -> None:
+        """Like `make`, but hands control back to the asyncio event loop
+        between steps, see `make_steps`"""
+        import asyncio  # noqa: PLC0415 only needed here
+
+        for _ in self.make_steps(test=test, mask_pattern=mask_pattern, step_size=step_size):
+            await asyncio.sleep(0)
+
+    def make_steps(
+        self, *, test: bool = False, mask_pattern: Union[int, str] = 0, step_size: int = 64
+    ):
+        """A generator doing the work of `make` a step at a time, yielding
+        None between stages, after each error correction block and mask
+        scored, and every `step_size` data codewords mapped (never, if 0).
+        The code is made once it is exhausted."""
+        stats = self.stats
+        mark = None
+        if stats is not None:
+            stats.clear()
+            mark = _get_stats_mark()
+        cache_key = None
+        if self.cache is not None and not test:
+            cache_key = self._get_cache_key(mask_pattern)
+            entry = self.cache.get(cache_key)
+            if entry is not None:
+                self.matrix, self.mask_pattern = entry
+                self.module_count = self.matrix.width
+                if stats is not None:
+                    _record_stats(stats, "cache_hit", mark)
+                return
+        auto = mask_pattern == "auto"
         self.module_count = self.type * 4 + 17
         self.matrix = QRBitMatrix(self.module_count, self.module_count)
 
+        self._setup_template()
+        if self.type >= 7 and test:
+            self._setup_type_number(test)
+        if auto:
+            # the type info modules are filled in per mask
+            self.matrix[self.module_count - 8, 8] = not test
+        else:
+            self._setup_type_info(test, mask_pattern)
+        if stats is not None:
+            mark = _record_stats(stats, "setup", mark)
+        yield
+
+        if self.data_cache is None:
+            mark = yield from self._setup_data_cache_steps(mark)
+        if auto:
+            mask_pattern = yield from self._map_data_best_mask_steps(
+                self.data_cache, test, step_size
+            )
+        else:
+            yield from self._map_data_steps(self.data_cache, mask_pattern, step_size)
+        if stats is not None:
+            _record_stats(stats, "map_data", mark)
+        self._finish_make(mask_pattern, cache_key)
+
+    def _finish_make(self, mask_pattern: int, cache_key: Optional[Tuple]) -> None:
+        """Store the mask pattern used, then free memory and freeze and cache
+        the matrix if set up to"""
+        self.mask_pattern = mask_pattern
+        if self.low_memory:
+            self._free_memory()
+        if cache_key is not None:
+            self.matrix = self.matrix.freeze()
+            self.cache.put(cache_key, self.matrix, mask_pattern)
+
+    def _free_memory(self) -> None:
+        """Drop everything but the finished matrix, including the template
+        for this type and the matrix's used map, as every module is set"""
+        self.matrix.used = None
+        self.data_cache = None
+        self._bit_buffer = None
+        if self._template is not None and _TEMPLATES.get(self.type) is self._template:
+            del _TEMPLATES[self.type]
+        self._template = None
+
+    def iter_rows(self, *, mask_pattern: int = 0):
+        """Generate the rows of the code packed like `QRBitMatrix.get_row`,
+        the same as `make` then `get_row` would give, without making the
+        matrix. Each row is worked out from the pattern geometry, the data
+        placement order and the mask, so only about one row is held at a
+        time besides the codewords. Takes a fixed mask pattern, not
+        ``"auto"``, which needs the whole matrix to score."""
+        count = self.module_count = self.type * 4 + 17
+        if self.data_cache is None:
+            _run_steps(self._setup_data_cache_steps(None))
+        type_info = QRUtil.get_BCH_type_info((self.ECC << 3) | mask_pattern)
+        type_number = QRUtil.get_BCH_type_number(self.type) if self.type >= 7 else 0
+        geometry = self._get_row_geometry(type_info, type_number)
+        pairs, owners, offsets = self._get_row_pairs(geometry)
+        stride = (count + 7) // 8
+        # rows are built in bytes, for boards without long integers, and
+        # the mask repeats every 12 rows
+        mask_rows = []
+        for y in range(12):
+            mask_row = bytearray(stride)
+            for x in range(count):
+                if QRUtil.get_mask(mask_pattern, x, y):
+                    mask_row[x >> 3] |= 0x80 >> (x & 7)
+            mask_rows.append(mask_row)
+
+        modules = None
+        next_modules = self._get_function_row(0, geometry)
+        pending = {}
+        for y in range(count):
+            modules = next_modules
+            if y + 1 < count:
+                next_modules = self._get_function_row(y + 1, geometry)
+            k = owners[y]
+            row = pending.pop(y, None)
+            if k is not None and y != pairs[k]:
+                # the first row of its pair reached, place the pair's data
+                col = pairs[k]
+                upper = next_modules if owners[col] == k else None
+                row, upper = self._place_pair_bits(modules, upper, k, offsets[k])
+                if upper is not None:
+                    pending[col] = upper
+            if row is None:
+                row = bytearray(stride)
+            mask_row = mask_rows[y % 12]
+            for x in range(count):
+                i = x >> 3
+                bit = 0x80 >> (x & 7)
+                if modules[x] == 2:
+                    row[i] |= bit
+                elif not modules[x] and k is not None and mask_row[i] & bit:
+                    # the path never reaches row 0, so it is left unmasked
+                    row[i] ^= bit
+            yield bytes(row)
+
+    def _place_pair_bits(
+        self, lower: bytearray, upper: Optional[bytearray], k: int, i: int
+    ) -> Tuple[bytearray, Optional[bytearray]]:
+        """Place data bits from bit `i` on over pair `k` of rows, given the
+        function rows of its lower and, if it holds data there, upper row.
+        At each module the data goes to the upper row then the lower one,
+        from the right on even pairs. Returns the two rows' packed data
+        bits, None for an upper row without data"""
+        count = self.module_count
+        data = self.data_cache
+        data_bits = len(data) * 8
+        stride = (count + 7) // 8
+        lower_bits = bytearray(stride)
+        upper_bits = None if upper is None else bytearray(stride)
+        for x in range(count - 1, -1, -1) if k % 2 == 0 else range(count):
+            if upper is not None and not upper[x]:
+                if i < data_bits and (data[i >> 3] << (i & 7)) & 0x80:
+                    upper_bits[x >> 3] |= 0x80 >> (x & 7)
+                i += 1
+            if not lower[x]:
+                if i < data_bits and (data[i >> 3] << (i & 7)) & 0x80:
+                    lower_bits[x >> 3] |= 0x80 >> (x & 7)
+                i += 1
+        return lower_bits, upper_bits
+
+    def _get_row_geometry(self, type_info: int, type_number: int) -> Tuple[List, Dict]:
+        """The position adjust pattern centers, and the (x, dark) type info
+        and type number modules by row, for `_get_function_row`"""
+        count = self.module_count
+        probes = ((0, 0), (count - 7, 0), (0, count - 7))
+        pos = QRUtil.get_pattern_position(self.type)
+        # skip those centered on a position probe or its separator
+        centers = [
+            (ax, ay)
+            for ax in pos
+            for ay in pos
+            if not any(px - 1 <= ax <= px + 7 and py - 1 <= ay <= py + 7 for px, py in probes)
+        ]
+        type_rows = {}
+        for i, modules in enumerate(QRCode._type_info_modules(count)):
+            for x, y in modules:
+                type_rows.setdefault(y, []).append((x, (type_info >> i) & 1))
+        type_rows[8].append((count - 8, 1))  # // fixed module
+        if type_number:
+            for i in range(18):
+                bit = (type_number >> i) & 1
+                type_rows.setdefault(i % 3 + count - 11, []).append((i // 3, bit))
+                type_rows[i // 3].append((i % 3 + count - 11, bit))
+        return centers, type_rows
+
+    def _get_row_pairs(self, geometry: Tuple[List, Dict]) -> Tuple[List, List, List]:
+        """The zigzag data placement runs over pairs of rows from the bottom
+        up, as in _setup_data_path. Skipping row 6 leaves row 4 in two pairs,
+        with its data in the first, and row 0 in none. Returns the first row
+        of each pair, the pair holding each row's data (or None) and where
+        each pair starts in the data bits"""
+        count = self.module_count
+        pairs = []
+        owners = [None] * count
+        for col in range(count - 1, 0, -2):
+            if col == 6:
+                col -= 1  # noqa: PLW2901 loop variable overwritten
+            for y in (col, col - 1):
+                if owners[y] is None:
+                    owners[y] = len(pairs)
+            pairs.append(col)
+        offsets = [0] * (len(pairs) + 1)
+        for y in range(count):
+            if owners[y] is not None:
+                free = self._get_function_row(y, geometry).count(0)
+                offsets[owners[y] + 1] += free
+        for k in range(len(pairs)):
+            offsets[k + 1] += offsets[k]
+        return pairs, owners, offsets
+
+    def _get_function_row(self, y: int, geometry: Tuple[List, Dict]) -> bytearray:
+        """The function modules of row y, one byte per module: 0 for a data
+        module, 1 for a light function module and 2 for a dark one. Patterns
+        are laid down in the order _setup_template draws them"""
+        count = self.module_count
+        row = bytearray(count)
+        centers, type_rows = geometry
+        for px, py in ((0, 0), (count - 7, 0), (0, count - 7)):
+            c = y - py
+            if -1 <= c <= 7:
+                for r in range(max(-1, -px), min(8, count - px)):
+                    dark = (
+                        (0 <= r <= 6 and c in (0, 6))
+                        or (0 <= c <= 6 and r in (0, 6))
+                        or (2 <= r <= 4 and 2 <= c <= 4)
+                    )
+                    row[px + r] = 2 if dark else 1
+        for ax, ay in centers:
+            c = y - ay
+            if -2 <= c <= 2:
+                for r in range(-2, 3):
+                    dark = abs(r) == 2 or abs(c) == 2 or (r == 0 and c == 0)
+                    row[ax + r] = 2 if dark else 1
+        if y == 6:
+            for x in range(8, count - 8):
+                if not row[x]:
+                    row[x] = 2 if x % 2 == 0 else 1
+        if 8 <= y < count - 8 and not row[6]:
+            row[6] = 2 if y % 2 == 0 else 1
+        for x, bit in type_rows.get(y, ()):
+            row[x] = 2 if bit else 1
+        return row
+
+    def _get_cache_key(self, mask_pattern: Union[int, str]) -> Tuple:
+        """What a matrix cache entry for this code depends on"""
+        data = tuple(bytes(chunk) for chunk in self.data_list)
+        return data, self.type, self.ECC, mask_pattern, self.optimize, self.structured_append
+
+    def _setup_data_cache_steps(self, mark: Optional[Tuple]):
+        """Generator finishing the bit stream of the data added so far and
+        adding the error correction codewords, recording stats for each step
+        from `mark`. Returns the mark for the next stage"""
+        length_range = _get_length_range(self.type)
+        if self._bit_buffer is None or self._bit_buffer_range != length_range:
+            self._bit_buffer = QRBitBuffer()
+            self._bit_buffer_range = length_range
+            if self.structured_append is not None:
+                index, count, parity = self.structured_append
+                self._bit_buffer.put(_MODE_STRUCTURED_APPEND, 4)
+                self._bit_buffer.put(index, 4)
+                self._bit_buffer.put(count - 1, 4)
+                self._bit_buffer.put(parity, 8)
+            for data in self.data_list:
+                QRCode._write_data(self._bit_buffer, data, self.type, self.optimize)
+        buffer = self._bit_buffer.copy()
+        QRCode._finish_data(buffer, self.type, self.ECC)
+        if mark is not None:
+            mark = _record_stats(self.stats, "create_data", mark)
+        yield
+        rs_blocks = _get_rs_blocks(self.type, self.ECC)
+        self.data_cache = yield from QRCode._create_bytes_steps(buffer, rs_blocks)
+        if mark is not None:
+            mark = _record_stats(self.stats, "create_bytes", mark)
+        return mark
+
+    def _setup_template(self) -> None:
+        """Copy the fixed patterns for this QR type into the matrix, drawing
+        and caching them the first time the type is used. The cache also
+        holds the data placement path and mask planes for the type. A type
+        whose template would not be kept is drawn without one"""
+        template = _TEMPLATES.pop(self.type, None)
+        if template is not None:
+            _TEMPLATES[self.type] = template  # now the most recently used
+            self.matrix.buffer[:] = template[0]
+            self.matrix.used[:] = template[1]
+            self._template = template
+            return
+
         self._setup_position_probe_pattern(0, 0)
         self._setup_position_probe_pattern(self.module_count - 7, 0)
         self._setup_position_probe_pattern(0, self.module_count - 7)
         self._setup_position_adjust_pattern()
         self._setup_timing_pattern()
-        self._setup_type_info(test, mask_pattern)
-
+        # reserve the type info modules, they depend on ECC and mask
+        self._setup_type_info(True, 0)
         if self.type >= 7:
-            self._setup_type_number(test)
+            self._setup_type_number(False)
+        if self.low_memory or _get_new_template_size(self.type) > TEMPLATE_CACHE_BYTES:
+            # the data is mapped straight onto the matrix instead
+            self._template = None
+            return
 
-        if self.data_cache is None:
-            self.data_cache = QRCode._create_data(self.type, self.ECC, self.data_list)
-        self._map_data(self.data_cache, mask_pattern)
+        buffer = bytes(self.matrix.buffer)
+        used = bytes(self.matrix.used)
+        mapped_used, path_index, path_shift = self._setup_data_path()
+        self.matrix.used[:] = used
+
+        template = (buffer, used, mapped_used, path_index, path_shift, [None] * 8)
+        _TEMPLATES[self.type] = self._template = template
+        _trim_templates()
 
     def _setup_position_probe_pattern(self, row: int, col: int) -> None:
         """Add the positition probe data pixels to the matrix"""
@@ -188,35 +733,179 @@ class QRCode:
         data = (self.ECC << 3) | mask_pattern
         bits = QRUtil.get_BCH_type_info(data)
 
-        # // vertical
-        for i in range(15):
+        for i, (vertical, horizontal) in enumerate(QRCode._type_info_modules(self.module_count)):
             mod = not test and ((bits >> i) & 1) == 1
+            self.matrix[vertical] = mod
+            self.matrix[horizontal] = mod
+
+        # // fixed module
+        self.matrix[self.module_count - 8, 8] = not test
+
+    @staticmethod
+    def _type_info_modules(module_count: int) -> List[Tuple[Tuple[int, int], Tuple[int, int]]]:
+        """The (vertical, horizontal) module positions of each type info bit"""
+        modules = []
+        for i in range(15):
+            # // vertical
             if i < 6:
-                self.matrix[i, 8] = mod
+                vertical = (i, 8)
             elif i < 8:
-                self.matrix[i + 1, 8] = mod
+                vertical = (i + 1, 8)
             else:
-                self.matrix[self.module_count - 15 + i, 8] = mod
-
-        # // horizontal
-        for i in range(15):
-            mod = not test and ((bits >> i) & 1) == 1
+                vertical = (module_count - 15 + i, 8)
+            # // horizontal
             if i < 8:
-                self.matrix[8, self.module_count - i - 1] = mod
+                horizontal = (8, module_count - i - 1)
             elif i < 9:
-                self.matrix[8, 15 - i - 1 + 1] = mod
+                horizontal = (8, 15 - i - 1 + 1)
             else:
-                self.matrix[8, 15 - i - 1] = mod
+                horizontal = (8, 15 - i - 1)
+            modules.append((vertical, horizontal))
+        return modules
+
+    def _map_data_best_mask(self, data: bytes, test: bool) -> int:
+        """Map the data once unmasked, score each mask pattern over it a line
+        at a time, then write the best one back. Returns the chosen pattern"""
+        return _run_steps(self._map_data_best_mask_steps(data, test, 0))
+
+    def _map_data_best_mask_steps(self, data: bytes, test: bool, step_size: int):
+        """Generator doing `_map_data_best_mask`, yielding after every mask
+        scored and as `_map_data_steps` does"""
+        count = self.module_count
+        matrix = self.matrix
+        stride = matrix.stride
+        pad = 8 * stride - count
+
+        # one int per row of the matrix, most significant bit first
+        used_rows = []
+        for y in range(count):
+            start = y * stride
+            used_rows.append(int.from_bytes(matrix.used[start : start + stride], "big"))
+        yield from self._map_data_steps(data, None, step_size)
+        rows = []
+        data_rows = []
+        for y in range(count):
+            start = y * stride
+            rows.append(int.from_bytes(matrix.buffer[start : start + stride], "big") >> pad)
+            used = int.from_bytes(matrix.used[start : start + stride], "big")
+            data_rows.append((used & ~used_rows[y]) >> pad)
+        cols = _transpose_lines(rows, count)
+        data_cols = _transpose_lines(data_rows, count)
+        type_info_modules = QRCode._type_info_modules(count)
+
+        best_rows = None
+        min_lost_point = 0
+        best_pattern = 0
+        for pattern in range(8):
+            mask_rows = _mask_lines(pattern, count, transpose=True)
+            mask_cols = _mask_lines(pattern, count)
+            masked_rows = [rows[i] ^ (mask_rows[i] & data_rows[i]) for i in range(count)]
+            masked_cols = [cols[i] ^ (mask_cols[i] & data_cols[i]) for i in range(count)]
+            if not test:
+                bits = QRUtil.get_BCH_type_info((self.ECC << 3) | pattern)
+                for i, modules in enumerate(type_info_modules):
+                    if (bits >> i) & 1:
+                        for x, y in modules:
+                            masked_rows[y] |= 1 << (count - 1 - x)
+                            masked_cols[x] |= 1 << (count - 1 - y)
+
+            lost_point = QRUtil.get_lost_point(masked_rows, masked_cols, count)
+            if best_rows is None or lost_point < min_lost_point:
+                min_lost_point = lost_point
+                best_pattern = pattern
+                best_rows = masked_rows
+            yield
+
+        for y, row in enumerate(best_rows):
+            start = y * stride
+            matrix.buffer[start : start + stride] = (row << pad).to_bytes(stride, "big")
+        return best_pattern
+
+    def _map_data(self, data: bytes, mask_pattern: Optional[int]) -> None:
+        """Map the data onto the QR code, unmasked if mask_pattern is None"""
+        for _ in self._map_data_steps(data, mask_pattern, 0):
+            pass
+
+    def _map_data_steps(self, data: bytes, mask_pattern: Optional[int], step_size: int):
+        """Generator doing `_map_data`, yielding every `step_size` codewords"""
+        if self._template is None:
+            yield from self._map_data_direct_steps(data, mask_pattern, step_size)
+            return
+        _, _, mapped_used, path_index, path_shift, mask_planes = self._template
+        buffer = self.matrix.buffer
+
+        if mask_pattern is not None:
+            plane = mask_planes[mask_pattern]
+            if plane is None:
+                plane = self._setup_mask_plane(mask_pattern)
+
+        # scatter the data bits along the placement path
+        path_length = len(path_index)
+        i = 0
+        step = 8 * step_size if step_size else path_length
+        for byte in data:
+            if i >= path_length:
+                break
+            if byte:
+                for j in range(min(8, path_length - i)):
+                    if (byte << j) & 0x80:
+                        buffer[path_index[i + j]] |= 1 << path_shift[i + j]
+            i += 8
+            if not i % step:
+                yield
+        self.matrix.used[:] = mapped_used
+
+        if mask_pattern is not None:
+            for i, bits in enumerate(plane):
+                if bits:
+                    buffer[i] ^= bits
+
+    def _map_data_direct_steps(self, data: bytes, mask_pattern: Optional[int], step_size: int):
+        """Generator doing `_map_data` without a template, walking the zigzag
+        placement over the empty modules and masking each as it is set"""
+        matrix = self.matrix
+        buffer = matrix.buffer
+        used = matrix.used
+        stride = matrix.stride
+        data_bits = len(data) * 8
+        step = 8 * step_size if step_size else 0
+        i = 0
+        inc = -1
+        row = self.module_count - 1
 
-        # // fixed module
-        self.matrix[self.module_count - 8, 8] = not test
+        for col in range(self.module_count - 1, 0, -2):
+            if col == 6:
+                col -= 1  # noqa: PLW2901 loop variable overwritten
+
+            while True:
+                bit = 0x80 >> (row & 7)
+                for c in range(2):
+                    index = (col - c) * stride + (row >> 3)
+                    if used[index] & bit:
+                        continue
+                    used[index] |= bit
+                    dark = i < data_bits and (data[i >> 3] << (i & 7)) & 0x80
+                    if mask_pattern is not None and QRUtil.get_mask(mask_pattern, row, col - c):
+                        dark = not dark
+                    if dark:
+                        buffer[index] |= bit
+                    i += 1
+                    if step and not i % step and i <= data_bits:
+                        yield
+                row += inc
+                if row < 0 or self.module_count <= row:
+                    row -= inc
+                    inc = -inc
+                    break
 
-    def _map_data(self, data: bytes, mask_pattern: int) -> None:
-        """Map the data onto the QR code"""
+    def _setup_data_path(self) -> Tuple[bytes, array, bytearray]:
+        """Walk the zigzag data placement over the empty modules once,
+        returns the used map afterwards and the buffer index and bit shift
+        of every data module in placement order"""
+        path_index = array("H")
+        path_shift = bytearray()
         inc = -1
         row = self.module_count - 1
-        bit_idx = 7
-        byte_idx = 0
 
         for col in range(self.module_count - 1, 0, -2):
             if col == 6:
@@ -225,42 +914,57 @@ class QRCode:
             while True:
                 for c in range(2):
                     if self.matrix[row, col - c] is None:
-                        dark = False
-                        if byte_idx < len(data):
-                            dark = ((data[byte_idx] >> bit_idx) & 1) == 1
-                        mask = QRUtil.get_mask(mask_pattern, row, col - c)
-                        if mask:
-                            dark = not dark
-                        self.matrix[row, col - c] = dark
-                        bit_idx -= 1
-                        if bit_idx == -1:
-                            byte_idx += 1
-                            bit_idx = 7
+                        self.matrix[row, col - c] = False
+                        index, shift = self.matrix.get_index(row, col - c)
+                        path_index.append(index)
+                        path_shift.append(shift)
                 row += inc
                 if row < 0 or self.module_count <= row:
                     row -= inc
                     inc = -inc
                     break
 
+        return bytes(self.matrix.used), path_index, path_shift
+
+    def _setup_mask_plane(self, mask_pattern: int) -> bytes:
+        """Build and cache the bits to flip for mask_pattern over the data
+        modules, laid out like the matrix buffer"""
+        _, _, _, path_index, path_shift, mask_planes = self._template
+        plane = bytearray(len(self.matrix.buffer))
+        for i, index in enumerate(path_index):
+            row, col = self.matrix.get_position(index, path_shift[i])
+            if QRUtil.get_mask(mask_pattern, row, col):
+                plane[index] |= 1 << path_shift[i]
+        mask_planes[mask_pattern] = plane = bytes(plane)
+        if _TEMPLATES.get(self.type) is self._template:
+            _trim_templates()
+        return plane
+
     @staticmethod
-    def _create_data(qr_type: int, ecc: int, data_list: list) -> bytes:
+    def _create_data(qr_type: int, ecc: int, data_list: list, optimize: bool = False) -> bytes:
         """Check and format data into bit buffer"""
-        rs_blocks = _get_rs_blocks(qr_type, ecc)
-
         buffer = QRBitBuffer()
-
         for data in data_list:
-            if isinstance(data, str):
-                data = str.encode(data)  # noqa: PLW2901 loop variable overwritten
-            buffer.put(_MODE_8BIT_BYTE, 4)
-            buffer.put(len(data), 8)
-            for byte in data:
-                buffer.put(byte, 8)
+            QRCode._write_data(buffer, data, qr_type, optimize)
+        QRCode._finish_data(buffer, qr_type, ecc)
+        return QRCode._create_bytes(buffer, _get_rs_blocks(qr_type, ecc))
 
+    @staticmethod
+    def _write_data(buffer: "QRBitBuffer", data: bytes, qr_type: int, optimize: bool) -> None:
+        """Append the segments for one chunk of data to the bit buffer"""
+        if isinstance(data, str):
+            data = str.encode(data)
+        for mode, segment in _get_segments(data, qr_type, optimize):
+            buffer.put(mode, 4)
+            buffer.put(len(segment), QRUtil.get_length_in_bits(mode, qr_type))
+            QRCode._write_segment(buffer, mode, segment)
+
+    @staticmethod
+    def _finish_data(buffer: "QRBitBuffer", qr_type: int, ecc: int) -> None:
+        """Terminate and pad the data segments in the bit buffer to the data
+        capacity of the QR type"""
         # // calc num max data.
-        total_data_count = 0
-        for block in rs_blocks:
-            total_data_count += block["data"]
+        total_data_count = _get_data_count(qr_type, ecc)
 
         if buffer.get_length_bits() > total_data_count * 8:
             raise RuntimeError(
@@ -272,86 +976,266 @@ class QRCode:
             buffer.put(0, 4)
 
         # // padding
-        while buffer.get_length_bits() % 8 != 0:
-            buffer.put_bit(False)
+        buffer.put(0, -buffer.get_length_bits() % 8)
 
         # // padding
-        while True:
-            if buffer.get_length_bits() >= total_data_count * 8:
-                break
-            buffer.put(_PAD0, 8)
-            if buffer.get_length_bits() >= total_data_count * 8:
-                break
-            buffer.put(_PAD1, 8)
+        pad_count = total_data_count - buffer.get_length_bits() // 8
+        buffer.put_bytes((_PAD_BYTES * ((pad_count + 1) // 2))[:pad_count])
 
-        return QRCode._create_bytes(buffer, rs_blocks)
+    @staticmethod
+    def _write_segment(buffer: "QRBitBuffer", mode: int, data: bytes) -> None:
+        """Pack the characters of one segment into the bit buffer"""
+        if mode == _MODE_NUMBER:
+            # three digits to 10 bits, a trailing two to 7 bits or one to 4 bits
+            for i in range(0, len(data), 3):
+                value = 0
+                for byte in data[i : i + 3]:
+                    value = value * 10 + byte - 0x30
+                buffer.put(value, 3 * len(data[i : i + 3]) + 1)
+        elif mode == _MODE_ALPHA_NUM:
+            # two characters to 11 bits, a trailing one to 6 bits
+            for i in range(0, len(data) - 1, 2):
+                buffer.put(_ALPHA_NUM_VALUES[data[i]] * 45 + _ALPHA_NUM_VALUES[data[i + 1]], 11)
+            if len(data) % 2:
+                buffer.put(_ALPHA_NUM_VALUES[data[-1]], 6)
+        else:
+            buffer.put_bytes(data)
 
     @staticmethod
-    def _create_bytes(buffer: bytes, rs_blocks: List[Dict]) -> bytes:  # noqa: PLR0912 Too many branches
-        """Perform error calculation math on bit buffer"""
+    def _create_bytes(buffer: bytes, rs_blocks: Tuple[Tuple[int, int], ...]) -> bytearray:
+        """Perform error calculation math on bit buffer, returns the
+        interleaved data and error correction codewords"""
+        return _run_steps(QRCode._create_bytes_steps(buffer, rs_blocks))
 
+    @staticmethod
+    def _create_bytes_steps(buffer: bytes, rs_blocks: Tuple[Tuple[int, int], ...]):
+        """Generator doing `_create_bytes`, yielding after each block"""
+        block_count = len(rs_blocks)
+        short_count = 0
+        total_data_count = 0
+        total_code_count = 0
+        for total, dc_count in rs_blocks:
+            if dc_count == rs_blocks[0][1]:
+                short_count += 1
+            total_data_count += dc_count
+            total_code_count += total
+        # every block of a given version and ECC level has the same number of
+        # error correction codewords, only the data lengths differ by one
+        short_total, short_dc_count = rs_blocks[0]
+        ec_count = short_total - short_dc_count
+        generator = _rs_generator(ec_count)
+
+        data = buffer.buffer
+        codes = bytearray(total_code_count)
+        ecdata = bytearray(ec_count)
         offset = 0
-        max_dc_count = 0
-        max_ec_count = 0
-
-        dcdata = [0] * len(rs_blocks)
-        ecdata = [0] * len(rs_blocks)
-
-        for r, block in enumerate(rs_blocks):
-            dc_count = block["data"]
-            ec_count = block["total"] - dc_count
-
-            max_dc_count = max(max_dc_count, dc_count)
-            max_ec_count = max(max_ec_count, ec_count)
 
-            dcdata[r] = [0] * dc_count
-
-            for i in range(len(dcdata[r])):
-                dcdata[r][i] = 0xFF & buffer.buffer[i + offset]
-            offset += dc_count
-
-            rs_poly = QRUtil.get_error_correct_polynomial(ec_count)
-            mod_poly = QRPolynomial(dcdata[r], rs_poly.get_length() - 1)
-
-            while True:
-                if mod_poly.get_length() - rs_poly.get_length() < 0:
-                    break
-                ratio = _glog(mod_poly.get(0)) - _glog(rs_poly.get(0))
-                num = [0 for x in range(mod_poly.get_length())]
-                for i in range(mod_poly.get_length()):
-                    num[i] = mod_poly.get(i)
-                for i in range(rs_poly.get_length()):
-                    num[i] ^= _gexp(_glog(rs_poly.get(i)) + ratio)
-                mod_poly = QRPolynomial(num, 0)
-
-            ecdata[r] = [0 for x in range(rs_poly.get_length() - 1)]
-            for i in range(len(ecdata[r])):
-                mod_index = i + mod_poly.get_length() - len(ecdata[r])
-                if mod_index >= 0:
-                    ecdata[r][i] = mod_poly.get(mod_index)
+        for r, (_, dc_count) in enumerate(rs_blocks):
+            for i in range(ec_count):
+                ecdata[i] = 0
+            for i in range(dc_count):
+                byte = data[offset + i]
+                # interleave the data codewords as we go
+                if i < short_dc_count:
+                    codes[i * block_count + r] = byte
+                else:
+                    codes[short_dc_count * block_count + r - short_count] = byte
+                # shift register division by the generator polynomial
+                factor = byte ^ ecdata[0]
+                if factor:
+                    log_factor = LOG_TABLE[factor]
+                    for j in range(ec_count - 1):
+                        ecdata[j] = ecdata[j + 1] ^ _EXP2_TABLE[log_factor + generator[j]]
+                    ecdata[ec_count - 1] = _EXP2_TABLE[log_factor + generator[ec_count - 1]]
                 else:
-                    ecdata[r][i] = 0
+                    for j in range(ec_count - 1):
+                        ecdata[j] = ecdata[j + 1]
+                    ecdata[ec_count - 1] = 0
+            offset += dc_count
 
-        total_code_count = 0
-        for block in rs_blocks:
-            total_code_count += block["total"]
+            for i in range(ec_count):
+                codes[total_data_count + i * block_count + r] = ecdata[i]
+            yield
+
+        return codes
+
+
+class MicroQRCode:
+    """The generator class for Micro QR code matrices, types M1 to M4. These
+    have a single finder pattern so fit short data in 11x11 to 17x17 modules"""
+
+    __slots__ = (
+        "ECC",
+        "_auto_type",
+        "data_list",
+        "mask_pattern",
+        "matrix",
+        "module_count",
+        "type",
+    )
+
+    def __init__(self, *, qr_type: Optional[int] = None, error_correct: Optional[int] = L):
+        """Initialize an empty Micro QR code. You can define the `qr_type`
+        (1-4 for M1-M4) or have the library auto-select the smallest match.
+        Default `error_correct` is type L, but you can select M, or Q for
+        M4. M1 only detects errors, pass None to use it. Each chunk
+        of data is stored in numeric, alphanumeric or byte mode, whichever
+        holds it all in the fewest bits"""
+        if not any(ecc == error_correct for _, ecc in _MICRO_SYMBOLS):
+            raise ValueError("Micro QR error correction must be L, M, Q or None")
+        if qr_type is not None and (qr_type, error_correct) not in _MICRO_SYMBOLS:
+            raise ValueError(f"M{qr_type} does not support this error correction")
+        self.type = qr_type
+        self.ECC = error_correct
+        self.matrix = None
+        self.module_count = 0
+        self.data_list = []
+        self.mask_pattern = None
+        self._auto_type = qr_type is None
 
-        data = [None] * total_code_count
-        index = 0
+    def add_data(self, data: bytes) -> None:
+        """Add more data to the Micro QR code. Can be a bytestring, or a str
+        which is UTF-8 encoded"""
+        if isinstance(data, str):
+            data = str.encode(data)
+        self.data_list.append(data)
 
-        for i in range(max_dc_count):
-            for r in range(len(rs_blocks)):
-                if i < len(dcdata[r]):
-                    data[index] = dcdata[r][i]
-                    index += 1
+        if self._auto_type:
+            # the largest type supporting the ECC level, unless a smaller fits
+            for qr_type in range(1, 5):
+                if (qr_type, self.ECC) in _MICRO_SYMBOLS:
+                    self.type = qr_type
+                    length_bits = self._get_length_bits()
+                    if length_bits is not None and length_bits <= self._get_symbol()[1]:
+                        break
+
+    def make(self, *, mask_pattern: Union[int, str] = 0) -> None:
+        """Perform the actual generation of the Micro QR matrix. Pass a
+        `mask_pattern` of 0-3, or "auto" to pick the one that leaves the most
+        dark modules on the outer edges, as readers prefer"""
+        symbol, data_bits, ec_count = self._get_symbol()
+        buffer = QRBitBuffer()
+        for data in self.data_list:
+            self._write_data(buffer, data)
+        MicroQRCode._finish_data(buffer, self.type, data_bits)
+        data_count = (data_bits + 7) // 8
+        data = QRCode._create_bytes(buffer, ((data_count + ec_count, data_count),))
 
-        for i in range(max_ec_count):
-            for r in range(len(rs_blocks)):
-                if i < len(ecdata[r]):
-                    data[index] = ecdata[r][i]
-                    index += 1
+        self.module_count = self.type * 2 + 9
+        self.matrix = QRBitMatrix(self.module_count, self.module_count)
+        self._setup_template()
+        modules = self._map_data(data, data_bits)
+        if mask_pattern == "auto":
+            scores = [self._get_mask_score(modules, pattern) for pattern in range(4)]
+            mask_pattern = scores.index(max(scores))
+        for row, col in modules:
+            if QRUtil.get_mask(_MICRO_MASKS[mask_pattern], row, col):
+                self.matrix[row, col] = not self.matrix[row, col]
+        self._setup_type_info(symbol, mask_pattern)
+        self.mask_pattern = mask_pattern
+
+    def _get_symbol(self) -> Tuple[int, int, int]:
+        """The symbol number, data bits and error correction codewords of
+        this type and ECC level"""
+        return _MICRO_SYMBOLS[self.type, self.ECC]
+
+    def _get_length_bits(self) -> Optional[int]:
+        """Encoded length of data_list in this type, or None if a chunk
+        needs a mode it lacks"""
+        length_bits = 0
+        for data in self.data_list:
+            mode = _get_micro_mode(data)
+            count_bits = _MICRO_MODES[mode][1][self.type - 1]
+            if not count_bits:
+                return None
+            length_bits += self.type - 1 + count_bits + _get_segment_data_bits(mode, len(data))
+        return length_bits
+
+    def _write_data(self, buffer: "QRBitBuffer", data: bytes) -> None:
+        """Append the segment for one chunk of data to the bit buffer"""
+        mode = _get_micro_mode(data)
+        indicator, count_bits = _MICRO_MODES[mode]
+        if not count_bits[self.type - 1]:
+            raise RuntimeError(f"M{self.type} has no mode for this data")
+        buffer.put(indicator, self.type - 1)
+        buffer.put(len(data), count_bits[self.type - 1])
+        QRCode._write_segment(buffer, mode, data)
 
-        return data
+    @staticmethod
+    def _finish_data(buffer: "QRBitBuffer", qr_type: int, data_bits: int) -> None:
+        """Terminate and pad the data segments in the bit buffer to the data
+        capacity. M1 and M3 end in a half codeword, padded with zeros"""
+        length_bits = buffer.get_length_bits()
+        if length_bits > data_bits:
+            raise RuntimeError(f"Code length overflow: {length_bits} > {data_bits}")
+
+        # terminator of 3, 5, 7 or 9 zero bits, cut short if full
+        buffer.put(0, min(data_bits - length_bits, qr_type * 2 + 1))
+        if data_bits - buffer.get_length_bits() < 8:
+            buffer.put(0, data_bits - buffer.get_length_bits())
+        else:
+            buffer.put(0, -buffer.get_length_bits() % 8)
+        pad_count = data_bits // 8 - buffer.get_length_bits() // 8
+        buffer.put_bytes((_PAD_BYTES * ((pad_count + 1) // 2))[:pad_count])
+        buffer.put(0, data_bits - buffer.get_length_bits())
+
+    def _setup_template(self) -> None:
+        """Add the finder, separator and timing patterns to the matrix, and
+        reserve the format info modules"""
+        for r in range(8):
+            for c in range(8):
+                self.matrix[r, c] = (r < 7 and c < 7) and (
+                    r in (0, 6) or c in (0, 6) or (2 <= r <= 4 and 2 <= c <= 4)
+                )
+        for i in range(8, self.module_count):
+            self.matrix[i, 0] = i % 2 == 0
+            self.matrix[0, i] = i % 2 == 0
+        self._setup_type_info(0, 0)
+
+    def _setup_type_info(self, symbol: int, mask_pattern: int) -> None:
+        """Add the format info pixels to the matrix"""
+        # the table holds G15 BCH codes masked for full size QR codes
+        bits = QRUtil.get_BCH_type_info(symbol << 2 | mask_pattern)
+        bits ^= QRUtil.G15_MASK ^ _MICRO_FORMAT_MASK
+        for i in range(8):
+            self.matrix[i + 1, 8] = (bits >> i) & 1
+            self.matrix[8, i + 1] = (bits >> (14 - i)) & 1
+
+    def _map_data(self, data: bytes, data_bits: int) -> List[Tuple[int, int]]:
+        """Place the codewords in the free modules, zigzagging up and down two
+        columns at a time from the bottom right, M1 and M3 skipping the low
+        half of their last data codeword. Returns the data module positions"""
+        last = (data_bits - 1) // 8
+        bits = []
+        for i, byte in enumerate(data):
+            for j in range(4 if i == last and data_bits % 8 else 8):
+                bits.append((byte << j) & 0x80)
+        modules = []
+        upward = True
+        for col in range(self.module_count - 1, 0, -2):
+            rows = range(self.module_count)
+            for row in reversed(rows) if upward else rows:
+                for c in (col, col - 1):
+                    if self.matrix[row, c] is None:
+                        self.matrix[row, c] = len(modules) < len(bits) and bits[len(modules)]
+                        modules.append((row, c))
+            upward = not upward
+        return modules
+
+    def _get_mask_score(self, modules: List[Tuple[int, int]], mask_pattern: int) -> int:
+        """How well mask_pattern suits the mapped data, higher is better.
+        Counts the dark modules along the right and bottom edges"""
+        edge = self.module_count - 1
+        sums = [0, 0]
+        for row, col in modules:
+            if edge in (row, col):
+                dark = bool(self.matrix[row, col]) != QRUtil.get_mask(
+                    _MICRO_MASKS[mask_pattern], row, col
+                )
+                # the corner module counts towards both edges
+                sums[0] += col == edge and dark
+                sums[1] += row == edge and dark
+        return min(sums) * 16 + max(sums)
 
 
 class QRUtil:
@@ -368,28 +1252,68 @@ class QRUtil:
         b"\x06\x18*",
         b"\x06\x1a.",
         b"\x06\x1c2",
+        b"\x06\x1e6",
+        b"\x06 :",
+        b'\x06">',
+        b"\x06\x1a.B",
+        b"\x06\x1a0F",
+        b"\x06\x1a2J",
+        b"\x06\x1e6N",
+        b"\x06\x1e8R",
+        b"\x06\x1e:V",
+        b'\x06">Z',
+        b"\x06\x1c2H^",
+        b"\x06\x1a2Jb",
+        b"\x06\x1e6Nf",
+        b"\x06\x1c6Pj",
+        b"\x06 :Tn",
+        b"\x06\x1e:Vr",
+        b'\x06">Zv',
+        b"\x06\x1a2Jbz",
+        b"\x06\x1e6Nf~",
+        b"\x06\x1a4Nh\x82",
+        b"\x06\x1e8Rl\x86",
+        b'\x06"<Vp\x8a',
+        b"\x06\x1e:Vr\x8e",
+        b'\x06">Zv\x92',
+        b"\x06\x1e6Nf~\x96",
+        b"\x06\x182Lf\x80\x9a",
+        b"\x06\x1c6Pj\x84\x9e",
+        b"\x06 :Tn\x88\xa2",
+        b"\x06\x1a6Rn\x8a\xa6",
+        b"\x06\x1e:Vr\x8e\xaa",
     ]
 
     G15 = 0b10100110111
     G18 = 0b1111100100101
     G15_MASK = 0b101010000010010
 
+    # G15 BCH encoded (and masked) type info, indexed by (ECC << 3) | mask
+    BCH_TYPE_INFO_TABLE = (
+        0x5412, 0x5125, 0x5E7C, 0x5B4B, 0x45F9, 0x40CE, 0x4F97, 0x4AA0,
+        0x77C4, 0x72F3, 0x7DAA, 0x789D, 0x662F, 0x6318, 0x6C41, 0x6976,
+        0x1689, 0x13BE, 0x1CE7, 0x19D0, 0x0762, 0x0255, 0x0D0C, 0x083B,
+        0x355F, 0x3068, 0x3F31, 0x3A06, 0x24B4, 0x2183, 0x2EDA, 0x2BED,
+    )  # fmt: skip
+
+    # G18 BCH encoded type number, indexed by QR type - 1
+    BCH_TYPE_NUMBER_TABLE = (
+        0x01F25, 0x0216F, 0x03E4A, 0x042DE, 0x05DFB, 0x063B1, 0x07C94, 0x085BC,
+        0x09A99, 0x0A4D3, 0x0BBF6, 0x0C762, 0x0D847, 0x0E60D, 0x0F928, 0x10B78,
+        0x1145D, 0x12A17, 0x13532, 0x149A6, 0x15683, 0x168C9, 0x177EC, 0x18EC4,
+        0x191E1, 0x1AFAB, 0x1B08E, 0x1CC1A, 0x1D33F, 0x1ED75, 0x1F250, 0x209D5,
+        0x216F0, 0x228BA, 0x2379F, 0x24B0B, 0x2542E, 0x26A64, 0x27541, 0x28C69,
+    )  # fmt: skip
+
     @staticmethod
     def get_BCH_type_info(data: int) -> int:
         """Encode with G15 BCH mask"""
-        d = data << 10
-        while QRUtil.get_BCH_digit(d) - QRUtil.get_BCH_digit(QRUtil.G15) >= 0:
-            d ^= QRUtil.G15 << (QRUtil.get_BCH_digit(d) - QRUtil.get_BCH_digit(QRUtil.G15))
-
-        return ((data << 10) | d) ^ QRUtil.G15_MASK
+        return QRUtil.BCH_TYPE_INFO_TABLE[data]
 
     @staticmethod
     def get_BCH_type_number(data: int) -> int:
         """Encode with G18 BCH mask"""
-        d = data << 12
-        while QRUtil.get_BCH_digit(d) - QRUtil.get_BCH_digit(QRUtil.G18) >= 0:
-            d ^= QRUtil.G18 << (QRUtil.get_BCH_digit(d) - QRUtil.get_BCH_digit(QRUtil.G18))
-        return (data << 12) | d
+        return QRUtil.BCH_TYPE_NUMBER_TABLE[data - 1]
 
     @staticmethod
     def get_BCH_digit(data: int) -> int:
@@ -400,6 +1324,18 @@ class QRUtil:
             data >>= 1
         return digit
 
+    @staticmethod
+    def get_length_in_bits(mode: int, qr_type: int) -> int:
+        """Size of the character count field for a mode and QR type"""
+        index = _get_length_range(qr_type)
+        if mode == _MODE_NUMBER:
+            return (10, 12, 14)[index]
+        if mode == _MODE_ALPHA_NUM:
+            return (9, 11, 13)[index]
+        if mode == _MODE_8BIT_BYTE:
+            return (8, 16, 16)[index]
+        raise ValueError("Bad mode:", mode)
+
     @staticmethod
     def get_pattern_position(qr_type: int) -> bytes:
         """The mask pattern position array for this QR type"""
@@ -417,7 +1353,7 @@ class QRUtil:
         if mask == 3:
             return (i + j) % 3 == 0
         if mask == 4:
-            return (math.floor(i / 2) + math.floor(j / 3)) % 2 == 0
+            return (i // 2 + j // 3) % 2 == 0
         if mask == 5:
             return (i * j) % 2 + (i * j) % 3 == 0
         if mask == 6:
@@ -426,6 +1362,60 @@ class QRUtil:
             return ((i * j) % 3 + (i + j) % 2) % 2 == 0
         raise ValueError("Bad mask pattern:" + mask)
 
+    @staticmethod
+    def get_lost_point(rows: List[int], cols: List[int], count: int) -> int:
+        """Score a symbol with the four ISO 18004 mask penalty rules. The
+        symbol is passed as one int per row and per column, bit n of a line
+        being its nth module. Lower is better"""
+        full = (1 << count) - 1
+        padded_full = (1 << (count + 8)) - 1
+        lost_point = 0
+
+        for lines in (rows, cols):
+            for line in lines:
+                light = ~line & full
+                for bits in (line, light):
+                    # // LEVEL1: 3 points for a run of five, +1 per extra module
+                    runs = bits & (bits >> 1) & (bits >> 2) & (bits >> 3) & (bits >> 4)
+                    if runs:
+                        starts = runs & ~(runs << 1)
+                        lost_point += bin(runs).count("1") + 2 * bin(starts).count("1")
+
+                # // LEVEL3: 1:1:3:1:1 finder-like runs with four light modules
+                # on either side, once each. Beyond the edge is the light quiet
+                # zone, so pad the line with four light modules on both ends
+                dark = line << 4
+                light = ~dark & padded_full
+                core = (
+                    dark
+                    & (light >> 1)
+                    & (dark >> 2)
+                    & (dark >> 3)
+                    & (dark >> 4)
+                    & (light >> 5)
+                    & (dark >> 6)
+                )
+                if core:
+                    after = (light >> 7) & (light >> 8) & (light >> 9) & (light >> 10)
+                    before = (light << 1) & (light << 2) & (light << 3) & (light << 4)
+                    lost_point += 40 * bin(core & (after | before)).count("1")
+
+        # // LEVEL2: 2x2 blocks of the same color
+        for i in range(count - 1):
+            row = rows[i]
+            vertical = ~(row ^ rows[i + 1])
+            blocks = vertical & (vertical >> 1) & ~(row ^ (row >> 1)) & (full >> 1)
+            lost_point += 3 * bin(blocks).count("1")
+
+        # // LEVEL4: dark ratio, 10 points per 5% away from 50%
+        dark_count = 0
+        for row in rows:
+            dark_count += bin(row).count("1")
+        total = count * count
+        lost_point += 10 * (abs(dark_count * 20 - total * 10) // total)
+
+        return lost_point
+
     @staticmethod
     def get_error_correct_polynomial(ecc_length: int) -> "QRPolynomial":
         """Generate a ecc polynomial"""
@@ -438,6 +1428,8 @@ class QRUtil:
 class QRPolynomial:
     """Structure for creating and manipulating error code polynomials"""
 
+    __slots__ = ("num",)
+
     def __init__(self, num: int, shift: int):
         """Create a QR polynomial"""
         if not num:
@@ -505,34 +1497,402 @@ _QRRS_BLOCK_TABLE = (
     b"\x02\x92t",
     b"\x04$\x0c\x04%\r",
     b"\x04$\x10\x04%\x11",
+    b"\x04E+\x01F,",
+    b"\x02VD\x02WE",
+    b"\x06+\x0f\x02,\x10",
+    b"\x06+\x13\x02,\x14",
+    b"\x01P2\x04Q3",
+    b"\x04eQ",
+    b"\x03$\x0c\x08%\r",
+    b"\x042\x16\x043\x17",
+    b"\x06:$\x02;%",
+    b"\x02t\\\x02u]",
+    b"\x07*\x0e\x04+\x0f",
+    b"\x04.\x14\x06/\x15",
+    b"\x08;%\x01<&",
+    b"\x04\x85k",
+    b'\x0c!\x0b\x04"\x0c',
+    b"\x08,\x14\x04-\x15",
+    b"\x04@(\x05A)",
+    b"\x03\x91s\x01\x92t",
+    b"\x0b$\x0c\x05%\r",
+    b"\x0b$\x10\x05%\x11",
+    b"\x05A)\x05B*",
+    b"\x05mW\x01nX",
+    b"\x0b$\x0c\x07%\r",
+    b"\x056\x18\x077\x19",
+    b"\x07I-\x03J.",
+    b"\x05zb\x01{c",
+    b"\x03-\x0f\r.\x10",
+    b"\x0f+\x13\x02,\x14",
+    b"\nJ.\x01K/",
+    b"\x01\x87k\x05\x88l",
+    b"\x02*\x0e\x11+\x0f",
+    b"\x012\x16\x0f3\x17",
+    b"\tE+\x04F,",
+    b"\x05\x96x\x01\x97y",
+    b"\x02*\x0e\x13+\x0f",
+    b"\x112\x16\x013\x17",
+    b"\x03F,\x0bG-",
+    b"\x03\x8dq\x04\x8er",
+    b"\t'\r\x10(\x0e",
+    b"\x11/\x15\x040\x16",
+    b"\x03C)\rD*",
+    b"\x03\x87k\x05\x88l",
+    b"\x0f+\x0f\n,\x10",
+    b"\x0f6\x18\x057\x19",
+    b"\x11D*",
+    b"\x04\x90t\x04\x91u",
+    b"\x13.\x10\x06/\x11",
+    b"\x112\x16\x063\x17",
+    b"\x11J.",
+    b"\x02\x8bo\x07\x8cp",
+    b'"%\r',
+    b"\x076\x18\x107\x19",
+    b"\x04K/\x0eL0",
+    b"\x04\x97y\x05\x98z",
+    b"\x10-\x0f\x0e.\x10",
+    b"\x0b6\x18\x0e7\x19",
+    b"\x06I-\x0eJ.",
+    b"\x06\x93u\x04\x94v",
+    b"\x1e.\x10\x02/\x11",
+    b"\x0b6\x18\x107\x19",
+    b"\x08K/\rL0",
+    b"\x08\x84j\x04\x85k",
+    b"\x16-\x0f\r.\x10",
+    b"\x076\x18\x167\x19",
+    b"\x13J.\x04K/",
+    b"\n\x8er\x02\x8fs",
+    b"!.\x10\x04/\x11",
+    b"\x1c2\x16\x063\x17",
+    b"\x16I-\x03J.",
+    b"\x08\x98z\x04\x99{",
+    b"\x0c-\x0f\x1c.\x10",
+    b"\x085\x17\x1a6\x18",
+    b"\x03I-\x17J.",
+    b"\x03\x93u\n\x94v",
+    b"\x0b-\x0f\x1f.\x10",
+    b"\x046\x18\x1f7\x19",
+    b"\x15I-\x07J.",
+    b"\x07\x92t\x07\x93u",
+    b"\x13-\x0f\x1a.\x10",
+    b"\x015\x17%6\x18",
+    b"\x13K/\nL0",
+    b"\x05\x91s\n\x92t",
+    b"\x17-\x0f\x19.\x10",
+    b"\x0f6\x18\x197\x19",
+    b"\x02J.\x1dK/",
+    b"\r\x91s\x03\x92t",
+    b"\x17-\x0f\x1c.\x10",
+    b"*6\x18\x017\x19",
+    b"\nJ.\x17K/",
+    b"\x11\x91s",
+    b"\x13-\x0f#.\x10",
+    b"\n6\x18#7\x19",
+    b"\x0eJ.\x15K/",
+    b"\x11\x91s\x01\x92t",
+    b"\x0b-\x0f..\x10",
+    b"\x1d6\x18\x137\x19",
+    b"\x0eJ.\x17K/",
+    b"\r\x91s\x06\x92t",
+    b";.\x10\x01/\x11",
+    b",6\x18\x077\x19",
+    b"\x0cK/\x1aL0",
+    b"\x0c\x97y\x07\x98z",
+    b"\x16-\x0f).\x10",
+    b"'6\x18\x0e7\x19",
+    b'\x06K/"L0',
+    b"\x06\x97y\x0e\x98z",
+    b"\x02-\x0f@.\x10",
+    b".6\x18\n7\x19",
+    b"\x1dJ.\x0eK/",
+    b"\x11\x98z\x04\x99{",
+    b"\x18-\x0f..\x10",
+    b"16\x18\n7\x19",
+    b"\rJ. K/",
+    b"\x04\x98z\x12\x99{",
+    b"*-\x0f .\x10",
+    b"06\x18\x0e7\x19",
+    b"(K/\x07L0",
+    b"\x14\x93u\x04\x94v",
+    b"\n-\x0fC.\x10",
+    b"+6\x18\x167\x19",
+    b"\x12K/\x1fL0",
+    b"\x13\x94v\x06\x95w",
+    b"\x14-\x0f=.\x10",
+    b'"6\x18"7\x19',
 )
 
-
-def _get_rs_blocks(qr_type: int, ecc: int) -> List[Dict]:
+# number of data codewords for each type and ECC level, indexed like the
+# block table above
+_DATA_CAPACITY = array("H")
+for _rs_block in _QRRS_BLOCK_TABLE:
+    _DATA_CAPACITY.append(
+        sum(_rs_block[_i] * _rs_block[_i + 2] for _i in range(0, len(_rs_block), 3))
+    )
+
+
+def _mask_lines(mask: int, count: int, transpose: bool = False) -> List[int]:
+    """The mask pattern as one int per line, most significant bit first like
+    the packed matrix rows, module n of line m set when [m, n] (or [n, m]
+    when transposed) gets flipped"""
+    # every mask pattern repeats every 12 modules in both directions
+    repeat = 0
+    for i in range(0, count, 12):
+        repeat |= 1 << i
+    pad = 12 * ((count + 11) // 12) - count
+    period = []
+    for i in range(12):
+        bits = 0
+        for j in range(12):
+            if QRUtil.get_mask(mask, j, i) if transpose else QRUtil.get_mask(mask, i, j):
+                bits |= 0x800 >> j
+        period.append((bits * repeat) >> pad)
+    return [period[i % 12] for i in range(count)]
+
+
+def _transpose_lines(lines: List[int], count: int) -> List[int]:
+    """Swap rows and columns of a matrix stored as one int per line"""
+    transposed = [0] * count
+    for i, line in enumerate(lines):
+        bits = line
+        j = count - 1
+        while bits:
+            if bits & 1:
+                transposed[j] |= 1 << (count - 1 - i)
+            bits >>= 1
+            j -= 1
+    return transposed
+
+
+def _get_template_size(template: Tuple) -> int:
+    """Bytes held by a cached template, counting the mask planes made so far"""
+    buffer, used, mapped_used, path_index, path_shift, mask_planes = template
+    size = len(buffer) + len(used) + len(mapped_used) + 2 * len(path_index) + len(path_shift)
+    for plane in mask_planes:
+        if plane is not None:
+            size += len(plane)
+    return size
+
+
+def _get_new_template_size(qr_type: int) -> int:
+    """Bytes a template for qr_type will hold at most once it has one mask
+    plane, from the count of modules left by the function patterns"""
+    count = qr_type * 4 + 17
+    # finders with separators, type info and the fixed module, then timing
+    modules = count * count - 3 * 64 - 31 - 2 * (count - 16)
+    adjust = len(QRUtil.get_pattern_position(qr_type))
+    if adjust:
+        # position adjust patterns, less those already counted on timing
+        modules -= (adjust * adjust - 3) * 25 - (adjust - 2) * 10
+    if qr_type >= 7:
+        modules -= 36
+    return 4 * count * ((count + 7) // 8) + 3 * modules
+
+
+def _trim_templates() -> None:
+    """Evict the least recently used templates until the rest fit in
+    TEMPLATE_CACHE_BYTES. One bigger than that on its own is not kept"""
+    size = 0
+    for template in _TEMPLATES.values():
+        size += _get_template_size(template)
+    while size > TEMPLATE_CACHE_BYTES:
+        size -= _get_template_size(_TEMPLATES.pop(next(iter(_TEMPLATES))))
+
+
+def _run_steps(steps):
+    """Exhaust a generator, returning its return value"""
+    try:
+        while True:
+            next(steps)
+    except StopIteration as stop:
+        return stop.value
+
+
+def _get_stats_mark() -> Tuple[int, Optional[int]]:
+    """The clock and heap size at the start of a stage"""
+    return _monotonic_ns(), _mem_alloc()
+
+
+def _record_stats(stats: Dict, name: str, mark: Tuple[int, Optional[int]]) -> Tuple:
+    """Store the time and heap growth since `mark` as stage `name`, and
+    return a mark for the next stage"""
+    now = _get_stats_mark()
+    grown = None if mark[1] is None or now[1] is None else now[1] - mark[1]
+    stats[name] = (now[0] - mark[0], grown)
+    return _get_stats_mark()
+
+
+def _get_length_range(qr_type: int) -> int:
+    """Which of the types 1-9, 10-26 or 27-40 (sharing character count
+    field sizes) the QR type falls in"""
+    if qr_type < 10:
+        return 0
+    if qr_type < 27:
+        return 1
+    return 2
+
+
+def _get_data_count(qr_type: int, ecc: int) -> int:
+    """Number of data codewords in this QR type and ECC level"""
+    return _DATA_CAPACITY[(qr_type - 1) * 4 + ecc]
+
+
+def _get_segment_length_bits(mode: int, length: int, qr_type: int) -> int:
+    """Bits taken by a segment of `length` characters, headers included"""
+    return 4 + QRUtil.get_length_in_bits(mode, qr_type) + _get_segment_data_bits(mode, length)
+
+
+def _get_segment_data_bits(mode: int, length: int) -> int:
+    """Bits taken by the characters of a segment of `length` characters"""
+    if mode == _MODE_NUMBER:
+        return 10 * (length // 3) + (0, 4, 7)[length % 3]
+    if mode == _MODE_ALPHA_NUM:
+        return 11 * (length // 2) + 6 * (length % 2)
+    return 8 * length
+
+
+def _get_micro_mode(data: bytes) -> int:
+    """The most compact single mode that holds all of data"""
+    mode = _MODE_NUMBER
+    for byte in data:
+        if byte >= 0x80 or _ALPHA_NUM_VALUES[byte] == 0xFF:
+            return _MODE_8BIT_BYTE
+        if _ALPHA_NUM_VALUES[byte] >= 10:
+            mode = _MODE_ALPHA_NUM
+    return mode
+
+
+def _get_segments(data: bytes, qr_type: int, optimize: bool) -> List[Tuple[int, bytes]]:
+    """Split data into (mode, bytes) segments. Without `optimize` that is a
+    single byte mode segment, otherwise the mix of numeric, alphanumeric
+    and byte mode segments that takes the fewest bits for this QR type"""
+    if not optimize or not data:
+        return [(_MODE_8BIT_BYTE, data)]
+
+    # Dynamic programming over the characters, tracking the cheapest way to
+    # end each character in each mode. Costs are kept in sixths of a bit so
+    # that numeric (3 1/3 bits) and alphanumeric (5 1/2 bits) stay whole
+    modes = (_MODE_NUMBER, _MODE_ALPHA_NUM, _MODE_8BIT_BYTE)
+    head_costs = [(4 + QRUtil.get_length_in_bits(mode, qr_type)) * 6 for mode in modes]
+    costs = list(head_costs)
+    # for each character, and each mode we could be in after it, the mode
+    # that character itself was encoded in
+    char_modes = bytearray(3 * len(data))
+    for i, byte in enumerate(data):
+        cur_costs = [None, None, costs[2] + 48]
+        if byte < 0x80 and _ALPHA_NUM_VALUES[byte] != 0xFF:
+            cur_costs[1] = costs[1] + 33
+            if _ALPHA_NUM_VALUES[byte] < 10:
+                cur_costs[0] = costs[0] + 20
+        for j in range(3):
+            char_modes[3 * i + j] = j
+        # or finish this segment here and start one in another mode
+        stay_costs = list(cur_costs)
+        for j in range(3):
+            for k in range(3):
+                if stay_costs[k] is None:
+                    continue
+                cost = (stay_costs[k] + 5) // 6 * 6 + head_costs[j]
+                if cur_costs[j] is None or cost < cur_costs[j]:
+                    cur_costs[j] = cost
+                    char_modes[3 * i + j] = k
+        costs = cur_costs
+
+    # walk back from the cheapest end state
+    state = costs.index(min(costs))
+    char_mode = bytearray(len(data))
+    for i in range(len(data) - 1, -1, -1):
+        state = char_modes[3 * i + state]
+        char_mode[i] = state
+
+    segments = []
+    start = 0
+    for i in range(1, len(data) + 1):
+        if i == len(data) or char_mode[i] != char_mode[start]:
+            segments.append((modes[char_mode[start]], data[start:i]))
+            start = i
+    return segments
+
+
+def _fill_bits(line: bytearray, start: int, end: int) -> None:
+    """Set bits `start` up to `end` of a line packed most significant bit
+    first, whole bytes at a time where it can"""
+    while start < end and start & 7:
+        line[start >> 3] |= 0x80 >> (start & 7)
+        start += 1
+    if end - start >= 8:
+        line[start >> 3 : end >> 3] = b"\xff" * ((end >> 3) - (start >> 3))
+        start = end & ~7
+    while start < end:
+        line[start >> 3] |= 0x80 >> (start & 7)
+        start += 1
+
+
+def _get_expand_table(scale: int) -> Optional[bytes]:
+    """Each byte value with every bit repeated `scale` times, as `scale`
+    bytes at ``scale * value``, made once per scale. None for a scale of
+    1, which needs no table"""
+    if scale == 1:
+        return None
+    table = _EXPAND_TABLES.get(scale)
+    if table is None:
+        table = bytearray(256 * scale)
+        for byte in range(256):
+            for i in range(8):
+                if byte & (0x80 >> i):
+                    start = 8 * byte * scale + i * scale
+                    _fill_bits(table, start, start + scale)
+        table = _EXPAND_TABLES[scale] = bytes(table)
+    return table
+
+
+def _put_bits(line: bytearray, bits: bytes, shift: int, end: int) -> None:
+    """OR packed `bits` into a packed line, moved `shift` bits along (back,
+    if negative), dropping any that land before bit 0 or from bit `end` on.
+    Works a byte at a time, so needs no long integers"""
+    size = len(line)
+    r = shift & 7
+    q = shift >> 3
+    for byte in bits:
+        if byte:
+            if 0 <= q < size:
+                line[q] |= byte >> r
+            if r and 0 <= q + 1 < size:
+                line[q + 1] |= (byte << (8 - r)) & 0xFF
+        q += 1
+    if end < 8 * size:
+        if end & 7:
+            line[end >> 3] &= (0xFF00 >> (end & 7)) & 0xFF
+        for i in range((end + 7) >> 3, size):
+            line[i] = 0
+
+
+def _get_rs_blocks(qr_type: int, ecc: int) -> Tuple[Tuple[int, int], ...]:
+    """The (total, data) codeword counts of each block"""
     rs_block = _QRRS_BLOCK_TABLE[(qr_type - 1) * 4 + ecc]
 
-    length = len(rs_block) // 3
-    blocks = []
-    for i in range(length):
-        count = rs_block[i * 3 + 0]
-        total = rs_block[i * 3 + 1]
-        data = rs_block[i * 3 + 2]
-        block = {"total": total, "data": data}
-        for _ in range(count):
-            blocks.append(block)
+    blocks = ()
+    for i in range(0, len(rs_block), 3):
+        blocks += ((rs_block[i + 1], rs_block[i + 2]),) * rs_block[i]
     return blocks
 
 
 class QRBitMatrix:
-    """A bit-packed storage class for matrices"""
+    """A bit-packed storage class for matrices. Each row is packed most
+    significant bit first into `stride` bytes of `buffer`, so bit 7 of
+    byte 0 holds [0, y] and row y starts at ``buffer[y * stride]``. A
+    parallel `used` map records which bits have been set, or is None
+    when every bit has been."""
+
+    __slots__ = ("buffer", "height", "stride", "used", "width")
 
     def __init__(self, width: int, height: int):
         self.width = width
         self.height = height
-        if width > 60:
-            raise ValueError("Max 60 bits wide:", width)
-        self.buffer = [0] * self.height * 2
-        self.used = [0] * self.height * 2
+        self.stride = (width + 7) // 8
+        self.buffer = bytearray(self.stride * height)
+        self.used = bytearray(self.stride * height)
 
     def __repr__(self) -> str:
         b = ""
@@ -545,34 +1905,432 @@ class QRBitMatrix:
             b += "\n"
         return b
 
+    def freeze(self) -> "QRFrozenMatrix":
+        """A read-only `QRFrozenMatrix` copy of the finished matrix, leaving
+        this one writable"""
+        return QRFrozenMatrix(self.width, self.height, self.buffer)
+
+    def copy(self) -> "QRBitMatrix":
+        """A new, writable matrix holding the same bits"""
+        other = QRBitMatrix(self.width, self.height)
+        other.buffer[:] = self.buffer
+        if self.used is None:
+            other.used = None
+        else:
+            other.used[:] = self.used
+        return other
+
+    def get_index(self, x: int, y: int) -> Tuple[int, int]:
+        """The buffer index and bit shift holding the bit at [x, y]"""
+        return y * self.stride + (x >> 3), 7 - (x & 7)
+
+    def get_position(self, index: int, shift: int) -> Tuple[int, int]:
+        """The [x, y] location of a buffer index and bit shift"""
+        return (index % self.stride) * 8 + 7 - shift, index // self.stride
+
+    def get_row(self, y: int) -> bytes:
+        """The packed bits of row y, `stride` bytes long"""
+        start = y * self.stride
+        return bytes(self.buffer[start : start + self.stride])
+
+    def set_row(self, y: int, bits: bytes) -> None:
+        """Overwrite row y with `stride` bytes of packed bits"""
+        start = y * self.stride
+        self.buffer[start : start + self.stride] = bits
+        if self.used is None:
+            return
+        for i in range(start, start + self.stride - 1):
+            self.used[i] = 0xFF
+        self.used[start + self.stride - 1] = (0xFF00 >> (self.width - 8 * self.stride + 8)) & 0xFF
+
+    def get_col(self, x: int) -> bytes:
+        """The packed bits of column x, most significant bit first like the
+        rows, ``(height + 7) // 8`` bytes long"""
+        col = bytearray((self.height + 7) // 8)
+        i = x >> 3
+        bit = 0x80 >> (x & 7)
+        for y in range(self.height):
+            if self.buffer[i] & bit:
+                col[y >> 3] |= 0x80 >> (y & 7)
+            i += self.stride
+        return bytes(col)
+
+    def to_bytes(self) -> bytes:
+        """A copy of the packed bits, `stride` bytes per row with set bits
+        for dark modules, padded with zero bits at the end of each row"""
+        return bytes(self.buffer)
+
+    def to_memoryview(self) -> memoryview:
+        """The packed bits laid out like `to_bytes`, without copying. Writes
+        through the view change the matrix, unless it is frozen."""
+        return memoryview(self.buffer)
+
+    def to_numpy(self, dtype=bool):
+        """A NumPy array of `height` rows and `width` columns, true or 1 for
+        dark modules. Needs NumPy and `adafruit_miniqr_host`."""
+        from adafruit_miniqr_host import to_numpy  # noqa: PLC0415 computers only
+
+        return to_numpy(self, dtype)
+
+    def __array__(self, dtype=None, copy=None):
+        return self.to_numpy(bool if dtype is None else dtype)
+
     def __getitem__(self, key: Tuple[int, int]) -> int:
         x, y = key
-        if y > self.width:
+        if x >= self.width or y >= self.height:
             raise ValueError()
-        i = 2 * x + (y // 30)
-        j = y % 30
-        if not self.used[i] & (1 << j):
+        i = y * self.stride + (x >> 3)
+        bit = 0x80 >> (x & 7)
+        if self.used is not None and not self.used[i] & bit:
             return None
-        return self.buffer[i] & (1 << j)
+        return self.buffer[i] & bit
 
     def __setitem__(self, key: Tuple[int, int], value: int) -> None:
         x, y = key
-        if y > self.width:
+        if x >= self.width or y >= self.height:
             raise ValueError()
-        i = 2 * x + (y // 30)
-        j = y % 30
+        i = y * self.stride + (x >> 3)
+        bit = 0x80 >> (x & 7)
         if value:
-            self.buffer[i] |= 1 << j
+            self.buffer[i] |= bit
+        else:
+            self.buffer[i] &= ~bit
+        if self.used is not None:
+            self.used[i] |= bit  # buffer item was set
+
+    def get_scanlines(self, scale: int = 1, border: int = 0, invert: bool = False):
+        """Generate each row scaled up `scale` times and framed by a `border`
+        module quiet zone, packed most significant bit first with set bits
+        for dark modules (or light ones if `invert`). Every scanline is
+        yielded once and should be repeated `scale` times."""
+        width = (self.width + 2 * border) * scale
+        stride = (width + 7) // 8
+        # built a byte at a time, for boards without long integers
+        expand = _get_expand_table(scale)
+        flip = bytearray(stride)
+        if invert:
+            _fill_bits(flip, 0, width)
+        blank = bytes(flip)
+        for _ in range(border):
+            yield blank
+        for y in range(self.height):
+            line = bytearray(stride)
+            start = y * self.stride
+            row = self.buffer[start : start + self.stride]
+            if expand is not None:
+                row = b"".join(expand[byte * scale : byte * scale + scale] for byte in row)
+            _put_bits(line, row, border * scale, width - border * scale)
+            if invert:
+                for i in range(stride):
+                    line[i] ^= flip[i]
+            yield bytes(line)
+        for _ in range(border):
+            yield blank
+
+    def to_text(self, *, border: int = 4, unicode: bool = True) -> str:
+        """The matrix drawn for a terminal with a `border` module quiet zone,
+        light modules white and dark ones black. Uses half block characters
+        for two rows per line, or with `unicode` off, pairs of spaces on ANSI
+        background colors, switching color only where it changes."""
+        width = self.width + 2 * border
+        # byte-wise scanlines, read as they are made
+        lines = self.get_scanlines(1, border, invert=True)
+        text = []
+        if unicode:
+            for top in lines:
+                bottom = next(lines, None) or bytes(len(top))
+                text.append("\x1b[1;37;40m")
+                for x in range(width):
+                    bit = 0x80 >> (x & 7)
+                    light = (2 if top[x >> 3] & bit else 0) | (1 if bottom[x >> 3] & bit else 0)
+                    text.append(_HALF_BLOCKS[light])
+                text.append("\x1b[0m\n")
+        else:
+            for line in lines:
+                color = None
+                for x in range(width):
+                    light = bool(line[x >> 3] & (0x80 >> (x & 7)))
+                    if light != color:
+                        color = light
+                        text.append("\x1b[1;47m" if light else "\x1b[40m")
+                    text.append("  ")
+                text.append("\x1b[0m\n")
+        return "".join(text)
+
+    def write_text(self, file, *, border: int = 4, unicode: bool = True) -> None:
+        """Write the matrix to a text file object such as `sys.stdout` in a
+        single call, drawn like `to_text`"""
+        file.write(self.to_text(border=border, unicode=unicode))
+
+    def blit(  # noqa: PLR0913 Too many arguments
+        self,
+        buffer: bytearray,
+        width: int,
+        height: int,
+        buffer_format: int = MONO_HLSB,
+        *,
+        x: int = 0,
+        y: int = 0,
+        scale: int = 1,
+        border: int = 4,
+        dark: int = 0,
+        light: int = 0xFFFF,
+        stride: Optional[int] = None,
+    ) -> None:
+        """Draw the matrix into a `width` by `height` framebuffer, each module
+        `scale` pixels across with a `border` module quiet zone, its top left
+        corner at pixel (`x`, `y`). Anything outside the framebuffer is
+        clipped. `buffer_format` is MONO_HLSB (rows of bytes, leftmost pixel
+        in the top bit), MONO_VLSB (pages of 8 rows, one byte per column, top
+        pixel in the bottom bit) or RGB565 (little-endian 16 bit pixels).
+        `dark` and `light` are the colors of the modules; mono formats set a
+        bit for any nonzero color. `stride` is the pixels per row, if more
+        than `width`."""
+        if stride is None:
+            stride = width
+        image_width = (self.width + 2 * border) * scale
+        image_height = (self.height + 2 * border) * scale
+        x0 = max(x, 0)
+        x1 = min(x + image_width, width)
+        y0 = max(y, 0)
+        y1 = min(y + image_height, height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        if buffer_format == MONO_HLSB:
+            self._blit_mono_hlsb(buffer, stride, x, y, x0, x1, y0, y1, scale, border, dark, light)
+        elif buffer_format == MONO_VLSB:
+            self._blit_mono_vlsb(buffer, stride, x, y, x0, x1, y0, y1, scale, border, dark, light)
+        elif buffer_format == RGB565:
+            self._blit_rgb565(buffer, stride, x, y, x0, x1, y0, y1, scale, border, dark, light)
         else:
-            self.buffer[i] &= ~(1 << j)
-        self.used[i] |= 1 << j  # buffer item was set
+            raise ValueError("Unsupported framebuffer format")
+
+    def _blit_mono_hlsb(  # noqa: PLR0913 Too many arguments
+        self, buffer, stride, x, y, x0, x1, y0, y1, scale, border, dark, light
+    ):
+        """Draw into horizontally packed mono rows, merging only the partial
+        bytes at either end of the clipped columns"""
+        row_bytes = (stride + 7) // 8
+        b0 = x0 >> 3
+        count = ((x1 + 7) >> 3) - b0
+        # the clipped columns of the first and last bytes touched
+        head = 0xFF >> (x0 & 7)
+        tail = (0xFF00 >> (((x1 - 1) & 7) + 1)) & 0xFF
+        if count == 1:
+            head = tail = head & tail
+        first_mask = ~head & 0xFF
+        last_mask = ~tail & 0xFF
+        data = bytearray(count)
+        for my, line in enumerate(self.get_scanlines(scale, border, invert=not dark)):
+            rows = range(max(y + my * scale, y0), min(y + my * scale + scale, y1))
+            if not rows:
+                continue
+            for i in range(count):
+                data[i] = 0xFF if dark and bool(dark) == bool(light) else 0
+            if bool(dark) != bool(light):
+                # the image's first column lands x - 8 * b0 bits in
+                _put_bits(data, line, x - 8 * b0, 8 * count)
+            data[0] &= head
+            data[-1] &= tail
+            for row in rows:
+                start = row * row_bytes + b0
+                end = start + count - 1
+                if count == 1:
+                    buffer[start] = (buffer[start] & (first_mask | last_mask)) | data[0]
+                    continue
+                buffer[start] = (buffer[start] & first_mask) | data[0]
+                buffer[start + 1 : end] = data[1:-1]
+                buffer[end] = (buffer[end] & last_mask) | data[-1]
+
+    def _blit_mono_vlsb(  # noqa: PLR0913 Too many arguments
+        self, buffer, stride, x, y, x0, x1, y0, y1, scale, border, dark, light
+    ):
+        """Draw into vertically packed mono pages, working out each page byte
+        once per module column and repeating it across the scaled columns"""
+        lines = list(self.get_scanlines(1, border))
+        on = bytes((0xFF,)) if dark else bytes(1)
+        off = bytes((0xFF,)) if light else bytes(1)
+        for page in range(y0 >> 3, ((y1 - 1) >> 3) + 1):
+            rows = range(max(page * 8, y0), min(page * 8 + 8, y1))
+            row_lines = [lines[(row - y) // scale] for row in rows]
+            mask = 0
+            for row in rows:
+                mask |= 1 << (row & 7)
+            start = page * stride
+            for mx in range((x0 - x) // scale, (x1 - 1 - x) // scale + 1):
+                i = mx >> 3
+                bit = 0x80 >> (mx & 7)
+                value = 0
+                for row, line in zip(rows, row_lines):
+                    value |= (on if line[i] & bit else off)[0] & (1 << (row & 7))
+                c0 = start + max(x + mx * scale, x0)
+                c1 = start + min(x + mx * scale + scale, x1)
+                if mask == 0xFF:
+                    buffer[c0:c1] = bytes((value,)) * (c1 - c0)
+                else:
+                    for c in range(c0, c1):
+                        buffer[c] = (buffer[c] & ~mask) | value
+
+    def _blit_rgb565(  # noqa: PLR0913 Too many arguments
+        self, buffer, stride, x, y, x0, x1, y0, y1, scale, border, dark, light
+    ):
+        """Draw 16 bit pixels, building each scaled row once and copying it
+        into every framebuffer row it covers"""
+        on = dark.to_bytes(2, "little") * scale
+        off = light.to_bytes(2, "little") * scale
+        width = self.width + 2 * border
+        for my, line in enumerate(self.get_scanlines(1, border)):
+            rows = range(max(y + my * scale, y0), min(y + my * scale + scale, y1))
+            if not rows:
+                continue
+            pixels = b"".join(
+                on if line[mx >> 3] & (0x80 >> (mx & 7)) else off for mx in range(width)
+            )
+            pixels = pixels[(x0 - x) * 2 : (x1 - x) * 2]
+            for row in rows:
+                start = (row * stride + x0) * 2
+                buffer[start : start + len(pixels)] = pixels
+
+    def write_pbm(self, file, *, scale: int = 1, border: int = 4) -> None:
+        """Write the matrix to a binary file object as a PBM image, with
+        `adafruit_miniqr_host.write_pbm`"""
+        from adafruit_miniqr_host import write_pbm  # noqa: PLC0415 computers only
+
+        write_pbm(self, file, scale=scale, border=border)
+
+    def write_png(self, file, *, scale: int = 1, border: int = 4) -> None:
+        """Write the matrix to a binary file object as a PNG image, with
+        `adafruit_miniqr_host.write_png`"""
+        from adafruit_miniqr_host import write_png  # noqa: PLC0415 computers only
+
+        write_png(self, file, scale=scale, border=border)
+
+    def write_svg(self, file, **kwargs) -> None:
+        """Write the matrix to a text file object as an SVG image, with
+        `adafruit_miniqr_host.write_svg`, which takes the same options"""
+        from adafruit_miniqr_host import write_svg  # noqa: PLC0415 computers only
+
+        write_svg(self, file, **kwargs)
+
+
+class QRFrozenMatrix(QRBitMatrix):
+    """An immutable QRBitMatrix, as made by `encode`. Two are equal when
+    they hold the same modules, and hash to match, so they can key dicts
+    and caches and be shared between threads without copying"""
+
+    __slots__ = ("_hash",)
+
+    def __init__(self, width: int, height: int, buffer: bytes):
+        object.__setattr__(self, "width", width)
+        object.__setattr__(self, "height", height)
+        object.__setattr__(self, "stride", (width + 7) // 8)
+        object.__setattr__(self, "buffer", bytes(buffer))
+        object.__setattr__(self, "used", None)
+        object.__setattr__(self, "_hash", hash((width, height, self.buffer)))
+
+    def __setattr__(self, name: str, value) -> None:
+        raise AttributeError("QRFrozenMatrix is immutable")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError("QRFrozenMatrix is immutable")
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, QRFrozenMatrix):
+            return NotImplemented
+        return (
+            self.width == other.width
+            and self.height == other.height
+            and self.buffer == other.buffer
+        )
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __reduce__(self) -> Tuple:
+        return QRFrozenMatrix, (self.width, self.height, self.buffer)
+
+    def freeze(self) -> "QRFrozenMatrix":
+        """Already read-only, returns the matrix"""
+        return self
+
+
+def encode(
+    data: bytes,
+    *,
+    error_correct: int = L,
+    version: Optional[int] = None,
+    mask: Union[int, str] = 0,
+    optimize: bool = False,
+) -> QRFrozenMatrix:
+    """Make the QR code for data in one call, returning its matrix as a
+    `QRFrozenMatrix`. The `version` (QR type) is the smallest that fits
+    unless given, `mask` is a pattern 0-7 or "auto", and `error_correct`
+    and `optimize` are as for `QRCode`"""
+    qr = QRCode(qr_type=version, error_correct=error_correct, optimize=optimize)
+    qr.add_data(data)
+    qr.make(mask_pattern=mask)
+    return QRFrozenMatrix(qr.matrix.width, qr.matrix.height, qr.matrix.buffer)
+
+
+class QRMatrixCache:
+    """A least recently used cache of finished matrices, for a `QRCode` to
+    reuse when made again with the same data, type, ECC level and mask.
+    Holds up to `max_bytes` of packed matrix bits, counting `hits` and
+    `misses`. Cached matrices are `QRFrozenMatrix`, `copy` one to change it."""
+
+    __slots__ = ("_entries", "hits", "max_bytes", "misses", "size")
+
+    def __init__(self, max_bytes: int = 16384):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Tuple) -> Optional[Tuple["QRFrozenMatrix", int]]:
+        """The matrix and mask pattern stored for a key, or None"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries[key] = entry  # now the most recently used
+        self.hits += 1
+        return entry
+
+    def put(self, key: Tuple, matrix: "QRBitMatrix", mask_pattern: int) -> None:
+        """Store a matrix as a `QRFrozenMatrix`, evicting the least recently
+        used ones to stay in budget. Matrices bigger than the budget are not
+        kept."""
+        size = len(matrix.buffer)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._evict(key)
+        while self.size + size > self.max_bytes:
+            self._evict(next(iter(self._entries)))
+        self._entries[key] = (matrix.freeze(), mask_pattern)
+        self.size += size
+
+    def clear(self) -> None:
+        """Drop every entry and reset the counters"""
+        self._entries.clear()
+        self.size = self.hits = self.misses = 0
+
+    def _evict(self, key: Tuple) -> None:
+        self.size -= len(self._entries.pop(key)[0].buffer)
 
 
 class QRBitBuffer:
-    """Storage class for a length of individual bits"""
+    """Storage class for a length of individual bits, packed most
+    significant bit first into a bytearray"""
+
+    __slots__ = ("buffer", "length")
 
     def __init__(self):
-        self.buffer = []
+        self.buffer = bytearray()
         self.length = 0
 
     def __repr__(self) -> str:
@@ -585,8 +2343,35 @@ class QRBitBuffer:
 
     def put(self, num: int, length: int) -> None:
         """Add a number of bits from a single integer value"""
-        for i in range(length):
-            self.put_bit(num & (1 << (length - i - 1)))
+        while length > 0:
+            offset = self.length & 7
+            if not offset:
+                self.buffer.append(0)
+            # fill as much of the last byte as we can in one go
+            count = min(8 - offset, length)
+            length -= count
+            bits = (num >> length) & ((1 << count) - 1)
+            self.buffer[-1] |= bits << (8 - offset - count)
+            self.length += count
+
+    def put_bytes(self, data: bytes) -> None:
+        """Add 8 bits for every byte of data, copying them straight in when
+        the buffer is byte aligned"""
+        offset = self.length & 7
+        if not offset:
+            self.buffer.extend(data)
+        else:
+            for byte in data:
+                self.buffer[-1] |= byte >> offset
+                self.buffer.append((byte << (8 - offset)) & 0xFF)
+        self.length += 8 * len(data)
+
+    def copy(self) -> "QRBitBuffer":
+        """A new bit buffer holding the same bits"""
+        other = QRBitBuffer()
+        other.buffer[:] = self.buffer
+        other.length = self.length
+        return other
 
     def get_length_bits(self) -> int:
         """Size of bit buffer"""
@@ -600,3 +2385,10 @@ class QRBitBuffer:
         if bit:
             self.buffer[i] |= 0x80 >> (self.length % 8)
         self.length += 1
+
+
+if __name__ == "__main__":
+    # the command line lives in its own module, so boards never load it
+    from adafruit_miniqr_cli import main
+
+    main()
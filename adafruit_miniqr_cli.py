@@ -0,0 +1,207 @@
+# SPDX-FileCopyrightText: 2026 Adafruit Industries
+#
+# SPDX-License-Identifier: MIT
+"""
+`adafruit_miniqr_cli`
+====================================================
+
+Command line for making QR code images in bulk on a computer, run as
+``python -m adafruit_miniqr``. Kept apart from `adafruit_miniqr` as it
+needs CPython, so boards never load it.
+
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import adafruit_miniqr
+import adafruit_miniqr_host
+
+try:
+    from typing import List, Optional, Tuple, Union
+except ImportError:
+    pass
+
+
+def _read_payloads(file, binary: bool):
+    """Generate the payloads in a binary file object, one per line, or each
+    prefixed by its length as 4 big-endian bytes if `binary`"""
+    if not binary:
+        for line in file:
+            yield line.rstrip(b"\r\n")
+        return
+    while True:
+        header = file.read(4)
+        if not header:
+            return
+        length = int.from_bytes(header, "big")
+        payload = file.read(length)
+        if len(header) < 4 or len(payload) < length:
+            raise ValueError("Truncated length-prefixed payload")
+        yield payload
+
+
+def _render_chunk(payloads: List[bytes], options: Tuple) -> List[Union[bytes, str]]:
+    """Make and render a list of payloads to image files, for one worker.
+    A payload that cannot be made gives its error message instead"""
+    image_format, error_correct, mask_pattern, optimize, scale, border = options
+    images = []
+    for payload in payloads:
+        qr = adafruit_miniqr.QRCode(error_correct=error_correct, optimize=optimize)
+        qr.add_data(payload)
+        try:
+            qr.make(mask_pattern=mask_pattern)
+        except RuntimeError as error:
+            images.append(str(error))
+            continue
+        if image_format == "svg":
+            file = io.StringIO()
+            adafruit_miniqr_host.write_svg(qr.matrix, file, scale=scale, border=border)
+            images.append(file.getvalue().encode())
+            continue
+        file = io.BytesIO()
+        if image_format == "png":
+            adafruit_miniqr_host.write_png(qr.matrix, file, scale=scale, border=border)
+        else:
+            adafruit_miniqr_host.write_pbm(qr.matrix, file, scale=scale, border=border)
+        images.append(file.getvalue())
+    return images
+
+
+def _get_chunks(items, size: int):
+    """Generate lists of up to `size` items from an iterable"""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _parse_args(argv: Optional[List[str]]):
+    """The command line options for `main`"""
+    parser = argparse.ArgumentParser(
+        prog="python -m adafruit_miniqr",
+        description="Make a QR code image for every payload in a file",
+    )
+    parser.add_argument("input", nargs="?", default="-", help="payload file, default stdin")
+    parser.add_argument(
+        "-o", "--output", default=".", help="directory for the images, or a .zip archive"
+    )
+    parser.add_argument("-f", "--format", choices=("pbm", "png", "svg"), default="png")
+    parser.add_argument(
+        "--binary", action="store_true", help="payloads are prefixed by a 4 byte length"
+    )
+    parser.add_argument("-e", "--error-correct", choices=("L", "M", "Q", "H"), default="L")
+    parser.add_argument(
+        "-m",
+        "--mask",
+        choices=["auto", *map(str, range(8))],
+        default="auto",
+        help="mask pattern 0-7, default auto",
+    )
+    parser.add_argument("--optimize", action="store_true", help="use the smallest segment modes")
+    parser.add_argument("-s", "--scale", type=int, default=4)
+    parser.add_argument("-b", "--border", type=int, default=4)
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=256, help="payloads per task")
+    return parser.parse_args(argv)
+
+
+def _open_output(output: str, image_format: str) -> Optional[zipfile.ZipFile]:
+    """Open `output` as a zip archive if it is named like one, returning
+    it, otherwise make sure the directory exists"""
+    if output.endswith(".zip"):
+        compression = zipfile.ZIP_STORED if image_format == "png" else zipfile.ZIP_DEFLATED
+        return zipfile.ZipFile(output, "w", compression)
+    os.makedirs(output, exist_ok=True)
+    return None
+
+
+def _write_file(path: str, data: bytes) -> None:
+    """Write one image file"""
+    with open(path, "wb") as file:
+        file.write(data)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Make QR codes for every payload in a file, across worker processes.
+    Image n is named after payload n; payloads that do not fit in a QR code
+    are reported and skipped, then the command exits with status 1"""
+    import adafruit_miniqr_cli  # noqa: PLC0415 workers find _render_chunk by module name
+
+    args = _parse_args(argv)
+
+    options = (
+        args.format,
+        getattr(adafruit_miniqr, args.error_correct),
+        args.mask if args.mask == "auto" else int(args.mask),
+        args.optimize,
+        args.scale,
+        args.border,
+    )
+    archive = _open_output(args.output, args.format)
+    infile = sys.stdin.buffer if args.input == "-" else open(args.input, "rb")
+    chunks = _get_chunks(_read_payloads(infile, args.binary), args.chunk_size)
+
+    count = 0
+    skipped = 0
+    start = time.monotonic()
+
+    def save(images):
+        nonlocal count, skipped
+        for image in images:
+            if isinstance(image, str):
+                kind = "payload" if args.binary else "line"
+                sys.stderr.write(f"\r{kind} {count + 1} skipped: {image}\n")
+                skipped += 1
+            else:
+                name = f"{count:06d}.{args.format}"
+                if archive is not None:
+                    archive.writestr(name, image)
+                else:
+                    _write_file(os.path.join(args.output, name), image)
+            count += 1
+        rate = count / max(time.monotonic() - start, 1e-9)
+        sys.stderr.write(f"\r{count} codes, {rate:.0f}/s")
+
+    try:
+        if args.workers <= 1:
+            for chunk in chunks:
+                save(_render_chunk(chunk, options))
+        else:
+            # results are saved in submission order, with a few chunks in
+            # flight per worker to bound memory
+            with ProcessPoolExecutor(args.workers) as executor:
+                pending = deque()
+                for chunk in chunks:
+                    pending.append(
+                        executor.submit(adafruit_miniqr_cli._render_chunk, chunk, options)
+                    )
+                    if len(pending) >= 2 * args.workers:
+                        save(pending.popleft().result())
+                while pending:
+                    save(pending.popleft().result())
+    finally:
+        if infile is not sys.stdin.buffer:
+            infile.close()
+        if archive is not None:
+            archive.close()
+    elapsed = time.monotonic() - start
+    made = count - skipped
+    sys.stderr.write(f"\r{made} codes in {elapsed:.2f} s, {made / max(elapsed, 1e-9):.0f}/s\n")
+    if skipped:
+        sys.stderr.write(f"{skipped} payloads too long for a QR code were skipped\n")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
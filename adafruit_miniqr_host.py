@@ -0,0 +1,122 @@
+# SPDX-FileCopyrightText: 2026 Adafruit Industries
+#
+# SPDX-License-Identifier: MIT
+"""
+`adafruit_miniqr_host`
+====================================================
+
+PBM, PNG and SVG image writers and the NumPy export for `adafruit_miniqr`
+matrices, for use on a computer. Kept apart from `adafruit_miniqr` as they
+need CPython modules such as `zlib.compressobj`, so boards never load them.
+The `QRBitMatrix` methods of the same names call these.
+
+"""
+
+import zlib
+
+import adafruit_miniqr
+
+try:
+    from typing import Optional
+except ImportError:
+    pass
+
+
+def write_pbm(
+    matrix: adafruit_miniqr.QRBitMatrix, file, *, scale: int = 1, border: int = 4
+) -> None:
+    """Write a matrix to a binary file object as a packed (P4) PBM image,
+    each module `scale` pixels across, with a `border` module quiet zone"""
+    width = (matrix.width + 2 * border) * scale
+    height = (matrix.height + 2 * border) * scale
+    file.write(b"P4\n%d %d\n" % (width, height))
+    for line in matrix.get_scanlines(scale, border):
+        file.write(line * scale)
+
+
+def write_png(
+    matrix: adafruit_miniqr.QRBitMatrix, file, *, scale: int = 1, border: int = 4
+) -> None:
+    """Write a matrix to a binary file object as a 1-bit grayscale PNG
+    image, each module `scale` pixels across, with a `border` module quiet
+    zone"""
+    width = (matrix.width + 2 * border) * scale
+    height = (matrix.height + 2 * border) * scale
+    file.write(b"\x89PNG\r\n\x1a\n")
+    header = width.to_bytes(4, "big") + height.to_bytes(4, "big")
+    # bit depth 1, grayscale, deflate, no filtering, no interlacing
+    _write_png_chunk(file, b"IHDR", header + b"\x01\x00\x00\x00\x00")
+    compressor = zlib.compressobj(9)
+    for line in matrix.get_scanlines(scale, border, invert=True):
+        data = compressor.compress((b"\x00" + line) * scale)
+        if data:
+            _write_png_chunk(file, b"IDAT", data)
+    _write_png_chunk(file, b"IDAT", compressor.flush())
+    _write_png_chunk(file, b"IEND", b"")
+
+
+def _write_png_chunk(file, kind: bytes, data: bytes) -> None:
+    """Write one length and CRC framed chunk of a PNG file"""
+    file.write(len(data).to_bytes(4, "big"))
+    file.write(kind)
+    file.write(data)
+    file.write(zlib.crc32(data, zlib.crc32(kind)).to_bytes(4, "big"))
+
+
+def write_svg(  # noqa: PLR0913 Too many arguments
+    matrix: adafruit_miniqr.QRBitMatrix,
+    file,
+    *,
+    scale: int = 1,
+    border: int = 4,
+    dark: str = "#000",
+    light: Optional[str] = "#fff",
+) -> None:
+    """Write a matrix to a text file object as an SVG image, each module
+    `scale` pixels across, with a `border` module quiet zone. The dark
+    modules are one path with a subpath per horizontal run. A `light` of
+    None leaves the background transparent."""
+    width = matrix.width + 2 * border
+    height = matrix.height + 2 * border
+    file.write(
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width * scale}" '
+        f'height="{height * scale}" viewBox="0 0 {width} {height}" '
+        'shape-rendering="crispEdges">'
+    )
+    if light is not None:
+        file.write(f'<rect width="{width}" height="{height}" fill="{light}"/>')
+    file.write(f'<path fill="{dark}" d="')
+    # each subpath is moved to relative to the start of the last one
+    move = "M"
+    last_x = last_y = 0
+    for y in range(matrix.height):
+        row = matrix.get_row(y)
+        path = []
+        x = 0
+        while x < matrix.width:
+            byte = row[x >> 3]
+            if not byte & (0xFF >> (x & 7)):
+                x = (x | 7) + 1  # nothing more in this byte
+                continue
+            if not byte & (0x80 >> (x & 7)):
+                x += 1
+                continue
+            start = x
+            while x < matrix.width and row[x >> 3] & (0x80 >> (x & 7)):
+                x += 1
+            run = x - start
+            path.append(f"{move}{start + border - last_x} {y + border - last_y}h{run}v1h-{run}z")
+            move = "m"
+            last_x = start + border
+            last_y = y + border
+        file.write("".join(path))
+    file.write('"/></svg>\n')
+
+
+def to_numpy(matrix: adafruit_miniqr.QRBitMatrix, dtype=bool):
+    """A NumPy array of a matrix's `height` rows and `width` columns, true
+    or 1 for dark modules. Needs NumPy."""
+    import numpy as np  # noqa: PLC0415 optional dependency
+
+    rows = np.frombuffer(matrix.buffer, dtype=np.uint8).reshape(matrix.height, matrix.stride)
+    return np.unpackbits(rows, axis=1, count=matrix.width).astype(dtype, copy=False)
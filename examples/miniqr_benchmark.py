@@ -0,0 +1,308 @@
+# SPDX-FileCopyrightText: 2026 Adafruit Industries
+# SPDX-License-Identifier: MIT
+
+# Time QR generation on the host computer, run with CPython from a checkout:
+#   python examples/miniqr_benchmark.py [masks|memory|suite|svg|versions]
+#
+# The suite times each encode stage and renderer, and records peak memory,
+# for every version, ECC level and mask. Save its results and compare a
+# later run against them to catch regressions:
+#   python examples/miniqr_benchmark.py suite --json baseline.json
+#   python examples/miniqr_benchmark.py suite --compare baseline.json
+
+import argparse
+import io
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+
+# run from a checkout, import the library next to this examples directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import adafruit_miniqr  # noqa: E402 after the path is set up
+
+PAYLOAD = b"https://www.adafruit.com/circuitpython"
+
+
+def make_time(payload, qr_type, mask_pattern=0, number=20):
+    """Average milliseconds for one add_data() + make() of payload"""
+
+    def run():
+        qr = adafruit_miniqr.QRCode(qr_type=qr_type)
+        qr.add_data(payload)
+        qr.make(mask_pattern=mask_pattern)
+
+    run()  # warm up any caches
+    return timeit.timeit(run, number=number) / number * 1000
+
+
+def data_capacity(qr_type, error_correct=adafruit_miniqr.L):
+    """Bytes that fit in one byte mode segment of this QR type"""
+    total = adafruit_miniqr._get_data_count(qr_type, error_correct)
+    return total - (2 if qr_type < 10 else 3)
+
+
+def bench_masks():
+    """Compare one fixed-mask make() with mask_pattern="auto" """
+    print("version  fixed (ms)  auto (ms)  ratio")
+    for qr_type in range(3, 10):
+        fixed = make_time(PAYLOAD, qr_type, 0)
+        auto = make_time(PAYLOAD, qr_type, "auto")
+        print(f"{qr_type:7d}  {fixed:10.2f}  {auto:9.2f}  {auto / fixed:5.2f}")
+
+
+def bench_versions():
+    """Time make() of a full byte mode payload for every version"""
+    print("version  modules  bytes  make (ms)")
+    for qr_type in range(1, 41):
+        capacity = data_capacity(qr_type)
+        payload = bytes(i & 0xFF for i in range(capacity))
+        elapsed = make_time(payload, qr_type, number=5)
+        print(f"{qr_type:7d}  {qr_type * 4 + 17:7d}  {capacity:5d}  {elapsed:9.2f}")
+
+
+def make_memory(qr_type, low_memory):
+    """Peak heap bytes during make() of a full ECC level L byte mode payload,
+    and bytes still held after, both counted from after add_data() with an
+    empty template cache"""
+    adafruit_miniqr._TEMPLATES.clear()
+    payload = bytes(i & 0xFF for i in range(data_capacity(qr_type)))
+    tracemalloc.start()
+    try:
+        qr = adafruit_miniqr.QRCode(qr_type=qr_type, low_memory=low_memory)
+        qr.add_data(payload)
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        qr.make()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak - base, current - base
+
+
+def bench_memory():
+    """Heap use of make() with and without low_memory, for the README"""
+    print("version  peak (kB)  kept (kB)  low_memory peak (kB)  low_memory kept (kB)")
+    for qr_type in (1, 5, 9, 20, 40):
+        peak, kept = make_memory(qr_type, False)
+        low_peak, low_kept = make_memory(qr_type, True)
+        print(
+            f"{qr_type:7d}  {peak / 1000:9.1f}  {kept / 1000:9.1f}  "
+            f"{low_peak / 1000:20.1f}  {low_kept / 1000:20.1f}"
+        )
+
+
+def write_svg_rects(matrix, file, border=4):
+    """The naive SVG writer, one rect per dark module"""
+    size = matrix.width + 2 * border
+    file.write(f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}">')
+    file.write(f'<rect width="{size}" height="{size}" fill="#fff"/>')
+    for y in range(matrix.height):
+        for x in range(matrix.width):
+            if matrix[x, y]:
+                file.write(f'<rect x="{x + border}" y="{y + border}" width="1" height="1"/>')
+    file.write("</svg>\n")
+
+
+def bench_svg():
+    """Compare write_svg() with one rect per module, in size and time"""
+    print("version  rects (B)  path (B)  rects (ms)  path (ms)")
+    for qr_type in range(1, 10):
+        qr = adafruit_miniqr.QRCode(qr_type=qr_type)
+        qr.add_data(bytes(i & 0xFF for i in range(data_capacity(qr_type))))
+        qr.make()
+        sizes = []
+        times = []
+        for writer in (write_svg_rects, adafruit_miniqr.QRBitMatrix.write_svg):
+            svg = io.StringIO()
+            writer(qr.matrix, svg)
+            sizes.append(len(svg.getvalue()))
+            times.append(
+                timeit.timeit(lambda w=writer: w(qr.matrix, io.StringIO()), number=20) * 50
+            )
+        print(f"{qr_type:7d}  {sizes[0]:9d}  {sizes[1]:8d}  {times[0]:10.2f}  {times[1]:9.2f}")
+
+
+ECC_NAMES = {
+    adafruit_miniqr.L: "L",
+    adafruit_miniqr.M: "M",
+    adafruit_miniqr.Q: "Q",
+    adafruit_miniqr.H: "H",
+}
+
+
+def measure(run, number):
+    """Best of three average milliseconds for run(), and its peak traced
+    memory in bytes"""
+    run()  # warm up any caches
+    elapsed = min(timeit.repeat(run, number=number, repeat=3)) / number * 1000
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"ms": round(elapsed, 4), "peak_bytes": peak}
+
+
+def suite_payloads(qr_type, error_correct):
+    """Small, typical and full capacity byte mode payloads for a version"""
+    capacity = adafruit_miniqr._get_data_count(qr_type, error_correct) - (2 if qr_type < 10 else 3)
+    full = bytes(i & 0xFF for i in range(capacity))
+    return {"small": full[: min(8, capacity)], "typical": full[: capacity // 2], "full": full}
+
+
+def suite_stages(qr_type, error_correct, payload):
+    """The encode stages to time for one payload, as name: function"""
+    rs_blocks = adafruit_miniqr._get_rs_blocks(qr_type, error_correct)
+    codewords = adafruit_miniqr.QRBitBuffer()
+    codewords.put_bytes(
+        payload.ljust(adafruit_miniqr._get_data_count(qr_type, error_correct), b"\xec")
+    )
+
+    def add_data():
+        qr = adafruit_miniqr.QRCode(qr_type=qr_type, error_correct=error_correct)
+        qr.add_data(payload)
+
+    def create_data():
+        adafruit_miniqr.QRCode._create_data(qr_type, error_correct, [payload])
+
+    def create_bytes():
+        adafruit_miniqr.QRCode._create_bytes(codewords, rs_blocks)
+
+    def make():
+        qr = adafruit_miniqr.QRCode(qr_type=qr_type, error_correct=error_correct)
+        qr.add_data(payload)
+        qr.make()
+
+    return {
+        "add_data": add_data,
+        "create_data": create_data,
+        "create_bytes": create_bytes,
+        "make": make,
+    }
+
+
+def suite_masks(qr_type, error_correct, payload):
+    """_map_data for each mask, and the auto mask search, as name: function"""
+    qr = adafruit_miniqr.QRCode(qr_type=qr_type, error_correct=error_correct)
+    qr.add_data(payload)
+    qr.make()
+    stages = {}
+    for mask in range(8):
+
+        def map_data(mask=mask):
+            qr._setup_template()
+            qr._map_data(qr.data_cache, mask)
+
+        stages[f"map_data/mask{mask}"] = map_data
+
+    def map_data_auto():
+        qr._setup_template()
+        qr._map_data_best_mask(qr.data_cache, False)
+
+    stages["map_data/auto"] = map_data_auto
+    return stages
+
+
+def suite_renderers(qr_type):
+    """Each renderer drawing a full version, as name: function"""
+    qr = adafruit_miniqr.QRCode(qr_type=qr_type)
+    qr.add_data(suite_payloads(qr_type, adafruit_miniqr.L)["full"])
+    qr.make()
+    matrix = qr.matrix
+    size = (matrix.width + 8) * 2
+    framebuffer = bytearray((size + 7) // 8 * size)
+    return {
+        "render/pbm": lambda: matrix.write_pbm(io.BytesIO(), scale=2),
+        "render/png": lambda: matrix.write_png(io.BytesIO(), scale=2),
+        "render/svg": lambda: matrix.write_svg(io.StringIO()),
+        "render/text": matrix.to_text,
+        "render/blit": lambda: matrix.blit(framebuffer, size, size, scale=2),
+    }
+
+
+def run_suite(versions, number):
+    """Measure every stage, returning a dict of results keyed by
+    stage/version/ECC/payload"""
+    results = {}
+
+    def record(key, run):
+        results[key] = measure(run, number)
+        print(f"{key:40s} {results[key]['ms']:10.3f} ms {results[key]['peak_bytes']:9d} B")
+
+    for qr_type in versions:
+        for error_correct, ecc_name in ECC_NAMES.items():
+            payloads = suite_payloads(qr_type, error_correct)
+            for payload_name, payload in payloads.items():
+                for stage, run in suite_stages(qr_type, error_correct, payload).items():
+                    record(f"{stage}/v{qr_type}/{ecc_name}/{payload_name}", run)
+            for stage, run in suite_masks(qr_type, error_correct, payloads["full"]).items():
+                record(f"{stage}/v{qr_type}/{ecc_name}/full", run)
+        for stage, run in suite_renderers(qr_type).items():
+            record(f"{stage}/v{qr_type}", run)
+    return results
+
+
+def compare_results(baseline, results, threshold):
+    """Print results that got slower or bigger than the baseline by more
+    than threshold (a fraction), returning how many did"""
+    regressions = 0
+    for key, result in results.items():
+        before = baseline.get(key)
+        if before is None:
+            continue
+        for metric in ("ms", "peak_bytes"):
+            if before[metric] and result[metric] > before[metric] * (1 + threshold):
+                regressions += 1
+                print(
+                    f"REGRESSION {key} {metric}: {before[metric]} -> {result[metric]} "
+                    f"({result[metric] / before[metric]:.2f}x)"
+                )
+    print(f"{regressions} regressions over {threshold:.0%} in {len(results)} results")
+    return regressions
+
+
+def bench_suite(args):
+    """Time and measure the memory of each encode stage and renderer"""
+    versions = args.versions or list(range(1, 41))
+    results = run_suite(versions, args.number)
+    report = {"python": sys.version, "number": args.number, "results": results}
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=1, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)["results"]
+        if compare_results(baseline, results, args.threshold):
+            sys.exit(1)
+
+
+BENCHMARKS = {
+    "masks": bench_masks,
+    "memory": bench_memory,
+    "suite": bench_suite,
+    "svg": bench_svg,
+    "versions": bench_versions,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="adafruit_miniqr benchmarks")
+    parser.add_argument("benchmark", nargs="*", choices=sorted(BENCHMARKS), default=[])
+    suite = parser.add_argument_group("suite options")
+    suite.add_argument("--versions", type=int, nargs="+", help="versions to run, default all")
+    suite.add_argument("--number", type=int, default=5, help="calls per timing")
+    suite.add_argument("--json", help="write the results to this file")
+    suite.add_argument("--compare", help="flag regressions against this saved results file")
+    suite.add_argument(
+        "--threshold", type=float, default=0.25, help="slowdown fraction to flag, default 0.25"
+    )
+    args = parser.parse_args()
+    for name in args.benchmark or ["masks", "memory", "svg", "versions"]:
+        if name == "suite":
+            BENCHMARKS[name](args)
+        else:
+            BENCHMARKS[name]()
@@ -2,10 +2,28 @@
 #
 # SPDX-License-Identifier: MIT
 
+import asyncio
+import contextlib
+import io
+import os
+import pickle
 import random
+import re
+import subprocess
+import sys
+import tempfile
+import tracemalloc
 import unittest
+import zipfile
+import zlib
 
 import adafruit_miniqr
+import adafruit_miniqr_cli
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 def enc(msg, **args):
@@ -15,6 +33,39 @@ def enc(msg, **args):
     return _q.matrix
 
 
+def lost_point(matrix):
+    # ISO 18004 mask penalty, scored module by module
+    _count = matrix.width
+    _grid = [[bool(matrix[_x, _y]) for _x in range(_count)] for _y in range(_count)]
+    _lines = _grid + [list(_col) for _col in zip(*_grid)]
+    _score = 0
+    for _line in _lines:
+        # N1: runs of five or more of one color
+        _run = 1
+        for _i in range(1, _count + 1):
+            if _i < _count and _line[_i] == _line[_i - 1]:
+                _run += 1
+                continue
+            if _run >= 5:
+                _score += _run - 2
+            _run = 1
+        # N3: finder-like 1:1:3:1:1 with four light modules (or the edge) beside
+        _padded = [False] * 4 + _line + [False] * 4
+        for _i in range(len(_padded) - 6):
+            if _padded[_i : _i + 7] == [True, False, True, True, True, False, True]:
+                if not any(_padded[max(_i - 4, 0) : _i]) or not any(_padded[_i + 7 : _i + 11]):
+                    _score += 40
+    # N2: 2x2 blocks of one color
+    for _y in range(_count - 1):
+        for _x in range(_count - 1):
+            if _grid[_y][_x] == _grid[_y][_x + 1] == _grid[_y + 1][_x] == _grid[_y + 1][_x + 1]:
+                _score += 3
+    # N4: 10 points per whole 5% of dark modules away from 50%
+    _dark = sum(sum(_row) for _row in _grid)
+    _score += 10 * int(abs(100 * _dark / (_count * _count) - 50) // 5)
+    return _score
+
+
 class TestMiniQR(unittest.TestCase):
     def test_example(self):
         # Confirm the simple test that is in the docs
@@ -33,6 +84,17 @@ class TestMiniQR(unittest.TestCase):
             self.assertEqual(_m.width, _m.height)
             self.assertEqual(_m.width, expected_size[_t])
 
+    def test_qr_type_large(self):
+        # Confirm qr_type 10-40 work, with 16 bit byte counts
+        for _t in range(10, 41):
+            _m = enc(b"abc", qr_type=_t)
+            self.assertEqual(_m.width, _t * 4 + 17)
+        _qr = adafruit_miniqr.QRCode()
+        _qr.add_data(bytes(range(256)) * 11)
+        _qr.make()
+        self.assertEqual(_qr.type, 40)
+        self.assertEqual(_qr.matrix.width, 177)
+
     def test_qr_error_correct(self):
         # Confirm that error correct L,M,Q,H give different matrix
         matrices = set()
@@ -56,6 +118,43 @@ class TestMiniQR(unittest.TestCase):
             matrices.add(tuple(_qr.matrix.buffer))
         self.assertEqual(len(matrices), 8)  # All 8 are unique
 
+    def test_qr_pattern_mask_auto(self):
+        # Confirm "auto" picks the mask with the lowest penalty, drawn as a fixed make() would
+        _random = random.Random(2)
+        for _t in (1, 2, 5, 9, 14):
+            for _ in range(3):
+                _data = bytes(_random.randrange(256) for _ in range(_random.randrange(1, 20)))
+                _qr = adafruit_miniqr.QRCode(qr_type=_t)
+                _qr.add_data(_data)
+                _qr.make(mask_pattern="auto")
+                _auto = repr(_qr.matrix)
+                lost_points = []
+                for _m in range(8):
+                    _qr.make(mask_pattern=_m)
+                    lost_points.append(lost_point(_qr.matrix))
+                _best = lost_points.index(min(lost_points))
+                _qr.make(mask_pattern=_best)
+                self.assertEqual(_auto, repr(_qr.matrix))
+
+    def test_lost_point(self):
+        # Confirm the bit-parallel penalty score matches the module by module one
+        for _data, _t, _m in ((b"abc", 1, 0), (b"test_lost_point", 3, 4), (b"0" * 90, 9, 6)):
+            _qr = adafruit_miniqr.QRCode(qr_type=_t)
+            _qr.add_data(_data)
+            _qr.make(mask_pattern=_m)
+            _count = _qr.module_count
+            _rows = [0] * _count
+            _cols = [0] * _count
+            for _r in range(_count):
+                for _c in range(_count):
+                    if _qr.matrix[_r, _c]:
+                        _rows[_r] |= 1 << _c
+                        _cols[_c] |= 1 << _r
+            self.assertEqual(
+                adafruit_miniqr.QRUtil.get_lost_point(_rows, _cols, _count),
+                lost_point(_qr.matrix),
+            )
+
     def test_qr_auto(self):
         # Confirm that increasing message size increases the matrix size monotonically
         sizes = []
@@ -73,6 +172,23 @@ class TestMiniQR(unittest.TestCase):
             _b = enc(_s)
             self.assertEqual(_a.buffer, _b.buffer)
 
+    def test_qr_optimize(self):
+        # Confirm optimize splits into cheaper segments and picks a smaller code
+        _segments = adafruit_miniqr._get_segments(b"Serial: ABC-0123456789012", 1, True)
+        self.assertEqual(
+            _segments,
+            [
+                (adafruit_miniqr._MODE_8BIT_BYTE, b"Serial"),
+                (adafruit_miniqr._MODE_ALPHA_NUM, b": ABC-"),
+                (adafruit_miniqr._MODE_NUMBER, b"0123456789012"),
+            ],
+        )
+        _msg = b"0123456789" * 10
+        _plain = enc(_msg)
+        _optimized = enc(_msg, optimize=True)
+        self.assertEqual(_plain.width, 37)
+        self.assertEqual(_optimized.width, 29)
+
     def test_qr_all(self):
         for _ty in range(1, 10):
             for _ec in (
@@ -88,6 +204,717 @@ class TestMiniQR(unittest.TestCase):
                     _qr.make(mask_pattern=_m)
                     self.assertTrue(_qr.matrix is not None)
 
+    def test_rs_generator(self):
+        # Confirm the cached generator matches the polynomial built the long way
+        for _n in (7, 10, 13, 17, 22, 26, 30):
+            _poly = adafruit_miniqr.QRUtil.get_error_correct_polynomial(_n)
+            _logs = bytes(adafruit_miniqr.LOG_TABLE[_c] for _c in _poly.num[1:])
+            self.assertEqual(adafruit_miniqr._rs_generator(_n), _logs)
+
+    def test_bch_tables(self):
+        # Confirm the BCH lookup tables match a long-hand polynomial remainder
+        def bch(_data, _poly, _shift):
+            _d = _data << _shift
+            while _d.bit_length() >= _poly.bit_length():
+                _d ^= _poly << (_d.bit_length() - _poly.bit_length())
+            return (_data << _shift) | _d
+
+        _util = adafruit_miniqr.QRUtil
+        for _i in range(32):
+            _expected = bch(_i, _util.G15, 10) ^ _util.G15_MASK
+            self.assertEqual(_util.get_BCH_type_info(_i), _expected)
+        for _t in range(7, 41):
+            self.assertEqual(_util.get_BCH_type_number(_t), bch(_t, _util.G18, 12))
+
+    def test_template_cache(self):
+        # Confirm cached templates draw the same matrix and the cache stays capped
+        def make(qr_type, mask_pattern=0):
+            _qr = adafruit_miniqr.QRCode(qr_type=qr_type)
+            _qr.add_data(b"abc")
+            _qr.make(mask_pattern=mask_pattern)
+            return _qr
+
+        _budget = adafruit_miniqr.TEMPLATE_CACHE_BYTES
+        adafruit_miniqr.TEMPLATE_CACHE_BYTES = 16384
+        try:
+            adafruit_miniqr._TEMPLATES.clear()
+            _first = enc(b"abc", qr_type=7).buffer
+            self.assertEqual(enc(b"abc", qr_type=7).buffer, _first)
+            for _t in range(1, 10):
+                enc(b"abc", qr_type=_t)
+                _size = sum(
+                    map(adafruit_miniqr._get_template_size, adafruit_miniqr._TEMPLATES.values())
+                )
+                self.assertLessEqual(_size, adafruit_miniqr.TEMPLATE_CACHE_BYTES)
+            # least recently used types are evicted first, and too big ones not drawn
+            adafruit_miniqr._TEMPLATES.clear()
+            for _t in (1, 2, 1, 8, 9):
+                enc(b"abc", qr_type=_t)
+            self.assertEqual(list(adafruit_miniqr._TEMPLATES), [1, 8, 9])
+            self.assertIsNone(make(40)._template)
+            self.assertNotIn(40, adafruit_miniqr._TEMPLATES)
+            # with no budget every type maps its data directly, the same way
+            adafruit_miniqr.TEMPLATE_CACHE_BYTES = 0
+            for _t, _mask in ((1, 0), (7, 5), (15, "auto"), (40, 3)):
+                adafruit_miniqr._TEMPLATES.clear()
+                _direct = make(_t, _mask).matrix
+                self.assertFalse(adafruit_miniqr._TEMPLATES)
+                adafruit_miniqr.TEMPLATE_CACHE_BYTES = 1 << 22
+                self.assertEqual(repr(make(_t, _mask).matrix), repr(_direct))
+                self.assertIn(_t, adafruit_miniqr._TEMPLATES)
+                adafruit_miniqr.TEMPLATE_CACHE_BYTES = 0
+        finally:
+            adafruit_miniqr.TEMPLATE_CACHE_BYTES = _budget
+        # templates with one mask plane never hold more than predicted
+        for _t in range(1, 41):
+            adafruit_miniqr._TEMPLATES.pop(_t, None)
+            _size = adafruit_miniqr._get_template_size(make(_t)._template)
+            self.assertLessEqual(_size, adafruit_miniqr._get_new_template_size(_t))
+
+    def test_matrix_index(self):
+        # Confirm buffer index and bit shift map back to the same module
+        _m = adafruit_miniqr.QRBitMatrix(53, 53)
+        for _x in range(53):
+            for _y in range(53):
+                _index, _shift = _m.get_index(_x, _y)
+                self.assertEqual(_m.get_position(_index, _shift), (_x, _y))
+
+    def test_matrix_rows(self):
+        # Confirm packed rows and columns agree with per-module access
+        _m = enc(b"test_matrix_rows", qr_type=3)
+        for _i in range(_m.width):
+            _row = _m.get_row(_i)
+            _col = _m.get_col(_i)
+            self.assertEqual(len(_row), _m.stride)
+            for _j in range(_m.width):
+                self.assertEqual(bool(_row[_j >> 3] & (0x80 >> (_j & 7))), bool(_m[_j, _i]))
+                self.assertEqual(bool(_col[_j >> 3] & (0x80 >> (_j & 7))), bool(_m[_i, _j]))
+        _copy = adafruit_miniqr.QRBitMatrix(_m.width, _m.height)
+        for _y in range(_m.height):
+            _copy.set_row(_y, _m.get_row(_y))
+        self.assertEqual(repr(_copy), repr(_m))
+        self.assertIsNotNone(_copy[_m.width - 1, _m.height - 1])
+
+    def test_bit_buffer(self):
+        # Confirm multi-bit and byte writes pack the same bits as put_bit
+        _rand = random.Random(8)
+        _fast = adafruit_miniqr.QRBitBuffer()
+        _slow = adafruit_miniqr.QRBitBuffer()
+        for _ in range(200):
+            _length = _rand.randrange(1, 17)
+            _num = _rand.getrandbits(_length)
+            _fast.put(_num, _length)
+            for _i in range(_length):
+                _slow.put_bit((_num >> (_length - _i - 1)) & 1)
+            _data = bytes(_rand.getrandbits(8) for _ in range(_rand.randrange(4)))
+            _fast.put_bytes(_data)
+            for _byte in _data:
+                for _i in range(8):
+                    _slow.put_bit((_byte >> (7 - _i)) & 1)
+        self.assertEqual(_fast.get_length_bits(), _slow.get_length_bits())
+        self.assertEqual(_fast.buffer, _slow.buffer)
+
+    def test_add_data_incremental(self):
+        # Confirm chunks added one at a time, of any buffer type, encode the
+        # same as the whole payload created at once
+        _chunks = [b"0123456789", bytearray(b"HELLO WORLD"), memoryview(b"abc"), "d\u00e9f"]
+        for _optimize in (False, True):
+            _qr = adafruit_miniqr.QRCode(optimize=_optimize)
+            _data_list = []
+            for _ in range(20):
+                for _chunk in _chunks:
+                    _qr.add_data(_chunk)
+                    _data_list.append(_chunk)
+                    if _qr.type in (8, 9, 10, 11):
+                        # crosses a character count size change
+                        _qr.make()
+            _qr.make()
+            _ref = adafruit_miniqr.QRCode(qr_type=_qr.type, optimize=_optimize)
+            _ref.data_cache = adafruit_miniqr.QRCode._create_data(
+                _qr.type, _qr.ECC, _data_list, _optimize
+            )
+            self.assertEqual(_qr.data_cache, _ref.data_cache)
+            # and the type picked is the smallest the data fits
+            with self.assertRaises(RuntimeError):
+                adafruit_miniqr.QRCode._create_data(_qr.type - 1, _qr.ECC, _data_list, _optimize)
+
+    def test_qr_plan(self):
+        # Confirm the planned type is the one made, and that filling the
+        # remaining bits exactly still fits
+        for _ecc in range(4):
+            for _size in (0, 1, 17, 100, 1000):
+                _type, _remaining, _count = adafruit_miniqr.QRCode.plan(
+                    b"a" * _size, error_correct=_ecc
+                )
+                _qr = adafruit_miniqr.QRCode(error_correct=_ecc)
+                _qr.add_data(b"a" * _size)
+                _qr.make()
+                self.assertEqual((_type, _count), (_qr.type, _qr.matrix.width))
+                _extra = _size + _remaining // 8
+                self.assertEqual(
+                    adafruit_miniqr.QRCode.plan(b"a" * _extra, error_correct=_ecc)[0], _type
+                )
+                self.assertGreater(
+                    adafruit_miniqr.QRCode.plan(b"a" * (_extra + 1), error_correct=_ecc)[0], _type
+                )
+        self.assertEqual(
+            adafruit_miniqr.QRCode.plan("0" * 41, error_correct=adafruit_miniqr.L, optimize=True)[
+                0
+            ],
+            1,
+        )
+        with self.assertRaises(RuntimeError):
+            adafruit_miniqr.QRCode.plan(b"a" * 3000)
+
+    def test_host_module(self):
+        # Confirm the image writers load only when used, keeping zlib and
+        # the host module out of a board import
+        _code = (
+            "import sys, adafruit_miniqr; "
+            "print(sorted({'zlib', 'adafruit_miniqr_host'} & set(sys.modules)))"
+        )
+        _root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        _out = subprocess.run(
+            [sys.executable, "-c", _code], cwd=_root, capture_output=True, check=True, text=True
+        ).stdout
+        self.assertEqual(_out.strip(), "[]")
+
+    def test_write_pbm_png(self):
+        # Confirm every image pixel matches its module, and that the PNG
+        # holds the same scanlines as the PBM with light set instead of dark
+        _qr = adafruit_miniqr.QRCode(qr_type=2)
+        _qr.add_data(b"Adafruit")
+        _qr.make()
+        _m = _qr.matrix
+        for _scale, _border in ((1, 4), (3, 0), (5, 2)):
+            _size = (_m.width + 2 * _border) * _scale
+            _stride = (_size + 7) // 8
+            _pbm = io.BytesIO()
+            _m.write_pbm(_pbm, scale=_scale, border=_border)
+            _header = b"P4\n%d %d\n" % (_size, _size)
+            self.assertTrue(_pbm.getvalue().startswith(_header))
+            _pixels = _pbm.getvalue()[len(_header) :]
+            self.assertEqual(len(_pixels), _stride * _size)
+            for _y in range(_size):
+                for _x in range(_size):
+                    _bit = _pixels[_y * _stride + _x // 8] & (0x80 >> (_x % 8))
+                    _mx = _x // _scale - _border
+                    _my = _y // _scale - _border
+                    _dark = 0 <= _mx < _m.width and 0 <= _my < _m.height and _m[_mx, _my]
+                    self.assertEqual(bool(_bit), bool(_dark))
+            _png = io.BytesIO()
+            _m.write_png(_png, scale=_scale, border=_border)
+            _data = _png.getvalue()[8:]
+            _idat = b""
+            while _data:
+                _length = int.from_bytes(_data[:4], "big")
+                _kind, _chunk = _data[4:8], _data[8 : 8 + _length]
+                self.assertEqual(
+                    int.from_bytes(_data[8 + _length : 12 + _length], "big"),
+                    zlib.crc32(_kind + _chunk),
+                )
+                if _kind == b"IHDR":
+                    self.assertEqual(_chunk, _size.to_bytes(4, "big") * 2 + b"\x01\x00\x00\x00\x00")
+                elif _kind == b"IDAT":
+                    _idat += _chunk
+                _data = _data[12 + _length :]
+            self.assertEqual(_kind, b"IEND")
+            _lines = zlib.decompress(_idat)
+            _pad = _stride * 8 - _size
+            for _y in range(_size):
+                _line = _lines[_y * (_stride + 1) : (_y + 1) * (_stride + 1)]
+                self.assertEqual(_line[0], 0)
+                _row = int.from_bytes(_pixels[_y * _stride : (_y + 1) * _stride], "big")
+                _light = ((1 << _size) - 1) << _pad
+                self.assertEqual(int.from_bytes(_line[1:], "big"), _row ^ _light)
+
+    def test_to_text(self):
+        # Confirm both terminal drawings decode back to the modules, with a
+        # color escape only where the color changes
+        _qr = adafruit_miniqr.QRCode(qr_type=3)
+        _qr.add_data(b"https://www.adafruit.com")
+        _qr.make()
+        _m = _qr.matrix
+
+        def light(x, y):
+            _x, _y = x - 2, y - 2
+            return not (0 <= _x < _m.width and 0 <= _y < _m.height and _m[_x, _y])
+
+        _size = _m.width + 4
+        _lines = _m.to_text(border=2).splitlines()
+        self.assertEqual(len(_lines), (_size + 1) // 2)
+        for _i, _line in enumerate(_lines):
+            self.assertTrue(_line.startswith("\x1b[1;37;40m") and _line.endswith("\x1b[0m"))
+            _chars = _line[len("\x1b[1;37;40m") : -len("\x1b[0m")]
+            self.assertEqual(len(_chars), _size)
+            for _x, _char in enumerate(_chars):
+                _top = light(_x, 2 * _i)
+                _bottom = 2 * _i + 1 < _size and light(_x, 2 * _i + 1)
+                self.assertEqual(_char, " \u2584\u2580\u2588"[_top * 2 + _bottom])
+        _lines = _m.to_text(border=2, unicode=False).splitlines()
+        self.assertEqual(len(_lines), _size)
+        for _y, _line in enumerate(_lines):
+            _row = ""
+            _last = None
+            for _run in _line[: -len("\x1b[0m")].split("\x1b[")[1:]:
+                _color, _spaces = _run.split("m")
+                self.assertNotEqual(_color, _last)
+                _last = _color
+                _row += ("L" if _color == "1;47" else "D") * (len(_spaces) // 2)
+            self.assertEqual(_row, "".join("L" if light(_x, _y) else "D" for _x in range(_size)))
+
+    def test_matrix_export(self):
+        # Confirm the packed exports hold each module at its documented bit
+        _m = enc(b"https://www.adafruit.com")
+        _packed = _m.to_bytes()
+        self.assertEqual(_m.to_memoryview(), _packed)
+        self.assertEqual(len(_packed), _m.stride * _m.height)
+        for _y in range(_m.height):
+            for _x in range(_m.width):
+                _bit = _packed[_y * _m.stride + _x // 8] & (0x80 >> (_x % 8))
+                self.assertEqual(bool(_bit), bool(_m[_x, _y]))
+
+    @unittest.skipUnless(numpy, "needs NumPy")
+    def test_matrix_numpy(self):
+        _m = enc(b"https://www.adafruit.com")
+        _array = _m.to_numpy()
+        self.assertEqual(_array.shape, (_m.height, _m.width))
+        self.assertEqual(_array.dtype, numpy.bool_)
+        self.assertEqual(_m.to_numpy(numpy.uint8).dtype, numpy.uint8)
+        for _y in range(_m.height):
+            for _x in range(_m.width):
+                self.assertEqual(bool(_array[_y, _x]), bool(_m[_x, _y]))
+        self.assertTrue((numpy.asarray(_m) == _array).all())
+
+    def test_write_svg(self):
+        # Confirm the path covers exactly the dark modules, one subpath per run
+        _m = enc(b"https://www.adafruit.com/circuitpython")
+        _svg = io.StringIO()
+        _m.write_svg(_svg, scale=3, border=2, dark="red", light=None)
+        _size = _m.width + 4
+        _text = _svg.getvalue()
+        _header = f'xmlns="http://www.w3.org/2000/svg" width="{_size * 3}" height="{_size * 3}"'
+        self.assertTrue(_text.startswith(f'<svg {_header} viewBox="0 0 {_size} {_size}"'))
+        self.assertNotIn("<rect", _text)
+        _path = _text[_text.index('fill="red" d="') + 14 : _text.index('"/></svg>')]
+        _dark = set()
+        _x = _y = 0
+        for _move, _dx, _dy, _h, _back in re.findall(
+            r"([Mm])(-?\d+) (-?\d+)h(\d+)v1h-(\d+)z", _path
+        ):
+            self.assertEqual(_h, _back)
+            _x, _y = (int(_dx), int(_dy)) if _move == "M" else (_x + int(_dx), _y + int(_dy))
+            self.assertNotIn((_x - 1, _y), _dark)
+            _dark.update((_x + _i, _y) for _i in range(int(_h)))
+        _expected = {
+            (_x + 2, _y + 2) for _y in range(_m.height) for _x in range(_m.width) if _m[_x, _y]
+        }
+        self.assertEqual(_dark, _expected)
+
+    def test_blit(self):
+        # Confirm each framebuffer layout matches a per-pixel render, over
+        # a random background and with the image clipped at every edge
+        _m = enc(b"Adafruit")
+        _rand = random.Random(15)
+        _width, _height, _stride = 45, 37, 50
+        _sizes = {
+            adafruit_miniqr.MONO_HLSB: (_stride + 7) // 8 * _height,
+            adafruit_miniqr.MONO_VLSB: _stride * ((_height + 7) // 8),
+            adafruit_miniqr.RGB565: _stride * _height * 2,
+        }
+
+        def set_pixel(buffer, fmt, x, y, color):
+            if fmt == adafruit_miniqr.MONO_HLSB:
+                i, bit = y * ((_stride + 7) // 8) + x // 8, 0x80 >> (x % 8)
+            elif fmt == adafruit_miniqr.MONO_VLSB:
+                i, bit = (y // 8) * _stride + x, 1 << (y % 8)
+            else:
+                buffer[(y * _stride + x) * 2 : (y * _stride + x) * 2 + 2] = color.to_bytes(
+                    2, "little"
+                )
+                return
+            buffer[i] = buffer[i] | bit if color else buffer[i] & ~bit
+
+        for _fmt, _size in _sizes.items():
+            for _x, _y, _scale, _border, _dark, _light in (
+                (0, 0, 1, 4, 0, 0xFFFF),
+                (3, 5, 1, 0, 1, 0),
+                (-7, -3, 2, 2, 0x1234, 0xFEDC),
+                (20, 17, 3, 1, 0, 1),
+                (-40, 30, 2, 4, 1, 1),
+                (5, -100, 1, 0, 0, 0),
+                (-9, 2, 5, 3, 1, 0),
+            ):
+                _background = bytearray(_rand.getrandbits(8) for _ in range(_size))
+                _fast = bytearray(_background)
+                _m.blit(
+                    _fast,
+                    _width,
+                    _height,
+                    _fmt,
+                    x=_x,
+                    y=_y,
+                    scale=_scale,
+                    border=_border,
+                    dark=_dark,
+                    light=_light,
+                    stride=_stride,
+                )
+                _slow = bytearray(_background)
+                _image = (_m.width + 2 * _border) * _scale
+                for _py in range(max(_y, 0), min(_y + _image, _height)):
+                    for _px in range(max(_x, 0), min(_x + _image, _width)):
+                        _mx = (_px - _x) // _scale - _border
+                        _my = (_py - _y) // _scale - _border
+                        _on = 0 <= _mx < _m.width and 0 <= _my < _m.height and _m[_mx, _my]
+                        set_pixel(_slow, _fmt, _px, _py, _dark if _on else _light)
+                self.assertEqual(_fast, _slow, (_fmt, _x, _y, _scale, _border))
+        with self.assertRaises(ValueError):
+            _m.blit(bytearray(100), 10, 10, 2)
+        # scanline expansion tables are made once per scale, none for 1
+        self.assertIsNone(adafruit_miniqr._get_expand_table(1))
+        _table = adafruit_miniqr._get_expand_table(3)
+        self.assertIs(adafruit_miniqr._get_expand_table(3), _table)
+        self.assertEqual(_table[0xA1 * 3 : 0xA1 * 3 + 3], b"\xe3\x80\x07")
+
+    def test_make_stats(self):
+        # Confirm stats are off by default and each stage is timed when on
+        _qr = adafruit_miniqr.QRCode()
+        _qr.add_data(b"Adafruit")
+        _qr.make()
+        self.assertIsNone(_qr.stats)
+        _timed = adafruit_miniqr.QRCode(stats=True)
+        _timed.add_data(b"Adafruit")
+        _timed.make()
+        self.assertEqual(_timed.matrix.buffer, _qr.matrix.buffer)
+        self.assertEqual(set(_timed.stats), {"setup", "create_data", "create_bytes", "map_data"})
+        for _ns, _bytes in _timed.stats.values():
+            self.assertGreaterEqual(_ns, 0)
+            self.assertIsNone(_bytes)
+        # the data is cached after the first make()
+        tracemalloc.start()
+        try:
+            _timed.make(mask_pattern="auto")
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(set(_timed.stats), {"setup", "map_data"})
+        self.assertIsInstance(_timed.stats["map_data"][1], int)
+        # a matrix from the cache replaces the stats of the last make()
+        _cached = adafruit_miniqr.QRCode(stats=True, cache=adafruit_miniqr.QRMatrixCache())
+        _cached.add_data(b"Adafruit")
+        _cached.make()
+        self.assertIn("map_data", _cached.stats)
+        _cached.make()
+        self.assertEqual(set(_cached.stats), {"cache_hit"})
+        self.assertGreaterEqual(_cached.stats["cache_hit"][0], 0)
+
+    def test_matrix_cache(self):
+        # Confirm cached matrices are reused, frozen, and evicted least
+        # recently used first within the byte budget
+        _v1 = 3 * 21
+        _cache = adafruit_miniqr.QRMatrixCache(max_bytes=2 * _v1)
+
+        def make(data, mask_pattern=0):
+            _qr = adafruit_miniqr.QRCode(qr_type=1, cache=_cache)
+            _qr.add_data(data)
+            _qr.make(mask_pattern=mask_pattern)
+            return _qr
+
+        _a = make(b"one").matrix
+        self.assertEqual((_cache.hits, _cache.misses, _cache.size), (0, 1, _v1))
+        self.assertIs(make(b"one").matrix, _a)
+        self.assertIsNot(make(b"one", mask_pattern=1).matrix, _a)
+        self.assertEqual((_cache.hits, _cache.misses, len(_cache)), (1, 2, 2))
+        self.assertEqual(repr(_a), repr(enc(b"one", qr_type=1)))
+        self.assertIsInstance(_a, adafruit_miniqr.QRFrozenMatrix)
+        self.assertEqual(_a, adafruit_miniqr.encode(b"one", version=1))
+        with self.assertRaises(TypeError):
+            _a[0, 0] = 0
+        _copy = _a.copy()
+        _copy[0, 0] = 0
+        self.assertTrue(_a[0, 0])
+        _auto = make(b"two", mask_pattern="auto")
+        self.assertIs(make(b"two", mask_pattern="auto").matrix, _auto.matrix)
+        self.assertEqual(make(b"two", mask_pattern="auto").mask_pattern, _auto.mask_pattern)
+        # b"one" with mask 0 was used less recently than mask 1
+        self.assertEqual((len(_cache), _cache.size), (2, 2 * _v1))
+        self.assertIsNot(make(b"one").matrix, _a)
+        _cache.clear()
+        self.assertEqual((len(_cache), _cache.size, _cache.hits, _cache.misses), (0, 0, 0, 0))
+
+    def test_main(self):
+        # Confirm the command line writes every payload in order, the same
+        # with any number of workers
+        _payloads = [b"https://example.com/%d" % _i for _i in range(23)] + [b"", b"\r\n\x00"]
+        with tempfile.TemporaryDirectory() as _tmp:
+            _binary = os.path.join(_tmp, "payloads.bin")
+            with open(_binary, "wb") as _file:
+                for _payload in _payloads:
+                    _file.write(len(_payload).to_bytes(4, "big") + _payload)
+            _archives = []
+            for _workers in (1, 3):
+                _archive = os.path.join(_tmp, f"{_workers}.zip")
+                _args = [_binary, "--binary", "-o", _archive, "-f", "pbm", "-m", "2", "-e", "Q"]
+                with contextlib.redirect_stderr(io.StringIO()):
+                    adafruit_miniqr_cli.main(_args + ["-j", str(_workers), "--chunk-size", "4"])
+                with zipfile.ZipFile(_archive) as _zip:
+                    _archives.append([(_n, _zip.read(_n)) for _n in _zip.namelist()])
+            self.assertEqual(_archives[0], _archives[1])
+            for _i, (_name, _image) in enumerate(_archives[0]):
+                self.assertEqual(_name, f"{_i:06d}.pbm")
+                _qr = adafruit_miniqr.QRCode(error_correct=adafruit_miniqr.Q)
+                _qr.add_data(_payloads[_i])
+                _qr.make(mask_pattern=2)
+                _pbm = io.BytesIO()
+                _qr.matrix.write_pbm(_pbm, scale=4)
+                self.assertEqual(_image, _pbm.getvalue())
+            _lines = os.path.join(_tmp, "payloads.txt")
+            with open(_lines, "wb") as _file:
+                _file.write(b"one\ntwo\r\nthree")
+            _out = os.path.join(_tmp, "svg")
+            with contextlib.redirect_stderr(io.StringIO()):
+                adafruit_miniqr_cli.main([_lines, "-o", _out, "-f", "svg", "-j", "1"])
+            self.assertEqual(sorted(os.listdir(_out)), ["000000.svg", "000001.svg", "000002.svg"])
+            # a payload too long for any QR code is reported and skipped
+            with open(_lines, "wb") as _file:
+                _file.write(b"one\n" + b"x" * 3000 + b"\nthree\n")
+            _out = os.path.join(_tmp, "skip.zip")
+            _stderr = io.StringIO()
+            with contextlib.redirect_stderr(_stderr), self.assertRaises(SystemExit) as _exit:
+                adafruit_miniqr_cli.main([_lines, "-o", _out, "-f", "pbm", "-j", "2"])
+            self.assertEqual(_exit.exception.code, 1)
+            self.assertIn("line 2 skipped: Code length overflow", _stderr.getvalue())
+            with zipfile.ZipFile(_out) as _zip:
+                self.assertEqual(_zip.namelist(), ["000000.pbm", "000002.pbm"])
+            # bad mask patterns are rejected before any work starts
+            for _mask in ("9", "foo"):
+                _stderr = io.StringIO()
+                with contextlib.redirect_stderr(_stderr), self.assertRaises(SystemExit) as _exit:
+                    adafruit_miniqr_cli.main([_lines, "-o", _out, "-m", _mask])
+                self.assertEqual(_exit.exception.code, 2)
+                self.assertIn("invalid choice", _stderr.getvalue())
+
+    def test_make_steps(self):
+        # Confirm stepping through make gives the same code, yielding often,
+        # and that make_async lets other tasks run in between
+        for _type, _mask in ((1, 3), (9, 0), (9, "auto"), (15, "auto")):
+            _data = bytes(range(7 * _type))
+            _qr = adafruit_miniqr.QRCode(qr_type=_type, error_correct=adafruit_miniqr.H)
+            _qr.add_data(_data)
+            _qr.make(mask_pattern=_mask)
+            _stepped = adafruit_miniqr.QRCode(qr_type=_type, error_correct=adafruit_miniqr.H)
+            _stepped.add_data(_data)
+            _steps = sum(1 for _ in _stepped.make_steps(mask_pattern=_mask, step_size=16))
+            self.assertGreater(_steps, _type)
+            self.assertEqual(_stepped.matrix.buffer, _qr.matrix.buffer)
+            self.assertEqual(_stepped.mask_pattern, _qr.mask_pattern)
+
+        async def ticker(ticks):
+            while True:
+                ticks.append(None)
+                await asyncio.sleep(0)
+
+        async def make_async(qr, ticks):
+            task = asyncio.create_task(ticker(ticks))
+            await qr.make_async(mask_pattern="auto", step_size=16)
+            task.cancel()
+
+        _ticks = []
+        _async = adafruit_miniqr.QRCode(qr_type=15, error_correct=adafruit_miniqr.H)
+        _async.add_data(bytes(range(7 * 15)))
+        asyncio.run(make_async(_async, _ticks))
+        self.assertEqual(_async.matrix.buffer, _qr.matrix.buffer)
+        self.assertGreater(len(_ticks), 15)
+
+    def test_low_memory(self):
+        # Confirm low memory mode makes the same code and keeps only the
+        # matrix, and check the CPython heap figures given in the README,
+        # measured the same way as examples/miniqr_benchmark.py memory
+        for _type, _peak_limits, _low_limit in (
+            (1, (4500, 2500), 300),
+            (9, (14500, 4000), 700),
+            (40, (150000, 23000), 5000),
+        ):
+            # a full byte mode payload, less the mode and length header
+            _capacity = adafruit_miniqr._get_data_count(_type, adafruit_miniqr.L)
+            _capacity -= 2 if _type < 10 else 3
+            _data = bytes(_i & 0xFF for _i in range(_capacity))
+            _kept = []
+            for _low_memory in (False, True):
+                adafruit_miniqr._TEMPLATES.clear()
+                tracemalloc.start()
+                try:
+                    _qr = adafruit_miniqr.QRCode(qr_type=_type, low_memory=_low_memory)
+                    _qr.add_data(_data)
+                    _base = tracemalloc.get_traced_memory()[0]
+                    tracemalloc.reset_peak()
+                    _qr.make()
+                    _current, _peak = tracemalloc.get_traced_memory()
+                finally:
+                    tracemalloc.stop()
+                # low_memory makes the code without a template
+                self.assertLess(_peak - _base, _peak_limits[_low_memory])
+                _kept.append((_qr, _current - _base))
+            (_qr, _normal), (_low, _reduced) = _kept
+            self.assertEqual(repr(_low.matrix), repr(_qr.matrix))
+            self.assertIsNone(_low.matrix.used)
+            self.assertLess(_reduced, _low_limit)
+            self.assertLess(_reduced, _normal // 2)
+            _copy = _low.matrix.copy()
+            _copy[0, 0] = 0
+            self.assertFalse(_copy[0, 0])
+            _low.make(mask_pattern="auto")
+            self.assertEqual(_low.matrix.width, _qr.matrix.width)
+
+    def test_iter_rows(self):
+        # Confirm streamed rows match the made matrix, with less memory
+        for _type, _ecc, _mask in ((1, 0, 0), (2, 1, 5), (7, 2, 3), (14, 3, 7), (40, 1, 4)):
+            _data = bytes(_i * 7 & 0xFF for _i in range(8 * _type))
+            _qr = adafruit_miniqr.QRCode(qr_type=_type, error_correct=_ecc)
+            _qr.add_data(_data)
+            _qr.make(mask_pattern=_mask)
+            _rows = [_qr.matrix.get_row(_y) for _y in range(_qr.matrix.height)]
+            _streamed = adafruit_miniqr.QRCode(qr_type=_type, error_correct=_ecc)
+            _streamed.add_data(_data)
+            adafruit_miniqr._TEMPLATES.clear()
+            tracemalloc.start()
+            try:
+                _count = 0
+                for _y, _row in enumerate(_streamed.iter_rows(mask_pattern=_mask)):
+                    self.assertEqual(_row, _rows[_y])
+                    _count += 1
+                _peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            self.assertEqual(_count, len(_rows))
+            self.assertIsNone(_streamed.matrix)
+            self.assertFalse(adafruit_miniqr._TEMPLATES)
+            self.assertLess(_peak, 20000)
+
+    def test_split(self):
+        # Confirm structured append codes carry the header and join up again
+        _data = bytes(_i * 13 & 0xFF for _i in range(1000))
+        _parity = 0
+        for _byte in _data:
+            _parity ^= _byte
+        _codes = adafruit_miniqr.QRCode.split(_data, max_version=7)
+        _count = len(_codes)
+        self.assertGreater(_count, 1)
+        self.assertEqual(b"".join(_qr.data_list[0] for _qr in _codes), _data)
+        for _index, _qr in enumerate(_codes):
+            self.assertEqual(_qr.structured_append, (_index, _count, _parity))
+            self.assertLessEqual(_qr.type, 7)
+            _qr.make()
+            self.assertEqual(
+                bytes(_qr._bit_buffer.buffer[:3]),
+                bytes((0x30 | _index, (_count - 1) << 4 | _parity >> 4, (_parity & 0xF) << 4 | 4)),
+            )
+            # each code is the smallest type its share of the data fits in
+            _smaller = adafruit_miniqr.QRCode(
+                qr_type=_qr.type - 1, structured_append=_qr.structured_append
+            )
+            _smaller.add_data(_qr.data_list[0])
+            with self.assertRaises(RuntimeError):
+                _smaller.make()
+        _single = adafruit_miniqr.QRCode.split(b"short")
+        self.assertEqual(len(_single), 1)
+        self.assertIsNone(_single[0].structured_append)
+        with self.assertRaises(RuntimeError):
+            adafruit_miniqr.QRCode.split(bytes(5000), max_version=5)
+        with self.assertRaises(ValueError):
+            adafruit_miniqr.QRCode(structured_append=(2, 2, 0))
+
+    def test_micro_qr(self):
+        # Confirm Micro QR symbols match reference encodings, rows read MSB first
+        for _data, _type, _ecc, _mask, _rows in (
+            (
+                "01234567",
+                2,
+                adafruit_miniqr.L,
+                1,
+                (8149, 4189, 5965, 5967, 5980, 4177, 8143, 12, 6673, 3413, 7422, 646, 7479),
+            ),
+            (
+                "hello",
+                4,
+                adafruit_miniqr.M,
+                3,
+                (
+                    130389, 66827, 95286, 95303, 95262, 66948, 130275, 510, 87247,
+                    50058, 95325, 42031, 122199, 46625, 101955, 21946, 112238,
+                ),
+            ),
+        ):  # fmt: skip
+            _qr = adafruit_miniqr.MicroQRCode(qr_type=_type, error_correct=_ecc)
+            _qr.add_data(_data)
+            _qr.make(mask_pattern="auto")
+            self.assertEqual(_qr.mask_pattern, _mask)
+            _count = _qr.module_count
+            self.assertEqual(_count, _type * 2 + 9)
+            for _r, _row in enumerate(_rows):
+                for _c in range(_count):
+                    self.assertEqual(bool(_qr.matrix[_r, _c]), bool(_row >> (_count - 1 - _c) & 1))
+        # the smallest type holding the data's mode and length is picked
+        for _data, _ecc, _type in (
+            ("12345", None, 1),
+            ("AB-12", adafruit_miniqr.L, 2),
+            ("hi", adafruit_miniqr.L, 3),
+            ("0123456789012345", adafruit_miniqr.M, 3),
+            ("hello world", adafruit_miniqr.L, 4),
+        ):
+            _qr = adafruit_miniqr.MicroQRCode(error_correct=_ecc)
+            _qr.add_data(_data)
+            _qr.make()
+            self.assertEqual(_qr.type, _type)
+        with self.assertRaises(ValueError):
+            adafruit_miniqr.MicroQRCode(error_correct=adafruit_miniqr.H)
+        with self.assertRaises(ValueError):
+            adafruit_miniqr.MicroQRCode(qr_type=2, error_correct=adafruit_miniqr.Q)
+        _qr = adafruit_miniqr.MicroQRCode(qr_type=2)
+        _qr.add_data("hi")
+        self.assertRaises(RuntimeError, _qr.make)
+        _qr = adafruit_miniqr.MicroQRCode()
+        _qr.add_data("https://www.adafruit.com")
+        self.assertRaises(RuntimeError, _qr.make)
+
+    def test_encode(self):
+        # Confirm encode() matches make() and compares and hashes by value
+        _qr = adafruit_miniqr.QRCode(qr_type=3, error_correct=adafruit_miniqr.M)
+        _qr.add_data(b"test_encode")
+        _qr.make(mask_pattern=5)
+        _a = adafruit_miniqr.encode(
+            b"test_encode", error_correct=adafruit_miniqr.M, version=3, mask=5
+        )
+        self.assertEqual(repr(_a), repr(_qr.matrix))
+        self.assertEqual(_a.width, 29)
+        self.assertEqual(_a.get_row(4), _qr.matrix.get_row(4))
+        _b = adafruit_miniqr.encode(
+            "test_encode", error_correct=adafruit_miniqr.M, version=3, mask=5
+        )
+        self.assertIsNot(_a, _b)
+        self.assertEqual(_a, _b)
+        self.assertEqual(hash(_a), hash(_b))
+        self.assertEqual(len({_a, _b, adafruit_miniqr.encode(b"test_encode")}), 2)
+        self.assertNotEqual(_a, _qr.matrix)
+        self.assertEqual(pickle.loads(pickle.dumps(_a)), _a)
+        self.assertIs(_a.freeze(), _a)
+        _frozen = _qr.matrix.freeze()
+        self.assertEqual(_frozen, _a)
+        _qr.matrix[0, 0] = 0
+        self.assertTrue(_frozen[0, 0])
+        with self.assertRaises(AttributeError):
+            _a.width = 30
+        with self.assertRaises(TypeError):
+            _a[0, 0] = 1
+        _copy = _a.copy()
+        _copy[0, 0] = 0
+        self.assertTrue(_a[0, 0])
+        _auto = adafruit_miniqr.encode(b"test_encode", mask="auto")
+        _qr = adafruit_miniqr.QRCode()
+        _qr.add_data(b"test_encode")
+        _qr.make(mask_pattern="auto")
+        self.assertEqual(_auto.to_bytes(), _qr.matrix.to_bytes())
+
     def test_qr_maximum(self):
         msg = bytes([random.randrange(32, 127) for i in range(230)])
         _a = enc(msg)